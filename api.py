@@ -0,0 +1,108 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+from cache import cached, city_key, grid_key, zone_key
+from city_index import mark_unknown
+from http_client import get, get_json, json_body
+from ratelimit import ELECTRICITYMAP, OPEN_METEO, OPENWEATHER
+from records import (
+    parse_air_quality,
+    parse_carbon_intensity,
+    parse_current_weather,
+    parse_forecast,
+    parse_power_history,
+    parse_solar_radiation,
+)
+
+log = logging.getLogger("api")
+
+# Cache lifetimes (seconds) per endpoint, matched to how often upstream data changes
+CURRENT_WEATHER_TTL = 10 * 60
+FORECAST_TTL = 60 * 60
+AIR_POLLUTION_TTL = 60 * 60
+CARBON_INTENSITY_TTL = 15 * 60
+POWER_HISTORY_TTL = 60 * 60
+SOLAR_RADIATION_TTL = 3 * 60 * 60
+# Days of hourly solar radiation fetched, matching the 5-day weather forecast
+SOLAR_FORECAST_DAYS = 5
+
+# Upstream base URLs; overridable so the app can run against a local stub
+# (see benchmarks/stub_server.py)
+OPENWEATHER_URL = os.environ.get("OPENWEATHER_BASE_URL", "https://api.openweathermap.org").rstrip("/")
+ELECTRICITYMAP_URL = os.environ.get("ELECTRICITYMAP_BASE_URL", "https://api.electricitymap.org").rstrip("/")
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_BASE_URL", "https://api.open-meteo.com").rstrip("/")
+
+
+def get_api_key(name):
+    # Environment variables first (cron / headless runs), then Streamlit Cloud
+    # Secrets. Read on first use so this module imports without Streamlit.
+    if name in os.environ:
+        return os.environ[name]
+    import streamlit as st
+
+    return st.secrets[name]
+
+
+def get_city_json(url, city):
+    # OpenWeather answers 404 for names it cannot resolve; remember them so
+    # the app can reject the name without another upstream call
+    response = get(url)
+    if response is not None and response.status_code == 404:
+        mark_unknown(city)
+    return json_body(response)
+
+
+def parsed(parse, payload, *args):
+    # Validates a payload into its compact record; a payload missing the
+    # fields the app needs counts as a failed call and is not cached
+    if payload is None:
+        return None
+    try:
+        return parse(payload, *args)
+    except (KeyError, IndexError, TypeError, ValueError) as exc:
+        log.warning("%s: invalid payload (%r)", parse.__name__, exc)
+        return None
+
+
+def solar_key(lat, lon, day=None):
+    return grid_key(lat, lon) + (day or datetime.now().strftime("%Y-%m-%d"),)
+
+
+# HTTP requests from APIs
+@cached("forecast", ttl=FORECAST_TTL, key=city_key, limiter=OPENWEATHER)
+def get_weather_forecast(city):
+    url = f"{OPENWEATHER_URL}/data/2.5/forecast?q={city}&appid={get_api_key('OPENWEATHER_API_KEY')}&units=metric"
+    return parsed(parse_forecast, get_city_json(url, city))
+
+@cached("current_weather", ttl=CURRENT_WEATHER_TTL, key=city_key, limiter=OPENWEATHER)
+def get_current_weather(city):
+    url = f"{OPENWEATHER_URL}/data/2.5/weather?q={city}&appid={get_api_key('OPENWEATHER_API_KEY')}&units=metric"
+    return parsed(parse_current_weather, get_city_json(url, city))
+
+@cached("air_pollution", ttl=AIR_POLLUTION_TTL, key=grid_key, limiter=OPENWEATHER)
+def get_air_pollution(lat, lon):
+    url = f"{OPENWEATHER_URL}/data/2.5/air_pollution?lat={lat}&lon={lon}&appid={get_api_key('OPENWEATHER_API_KEY')}"
+    return parsed(parse_air_quality, get_json(url))
+
+@cached("carbon_intensity", ttl=CARBON_INTENSITY_TTL, key=zone_key, maxsize=32, limiter=ELECTRICITYMAP)
+def get_carbon_intensity(region):
+    url = f"{ELECTRICITYMAP_URL}/v3/carbon-intensity/latest?zone={region}"
+    headers = {"auth-token": get_api_key("ELECTRICITYMAP_API_KEY")}
+    return parsed(parse_carbon_intensity, get_json(url, headers=headers), region)
+
+@cached("power_history", ttl=POWER_HISTORY_TTL, key=zone_key, maxsize=32, limiter=ELECTRICITYMAP)
+def get_power_breakdown_history(region):
+    url = f"{ELECTRICITYMAP_URL}/v3/power-breakdown/history?zone={region}"
+    headers = {"auth-token": get_api_key("ELECTRICITYMAP_API_KEY")}
+    return parsed(parse_power_history, get_json(url, headers=headers), region)
+
+@cached("solar_radiation", ttl=SOLAR_RADIATION_TTL, key=solar_key, limiter=OPEN_METEO)
+def get_solar_radiation(lat, lon, day):
+    # Hourly radiation from `day` over the forecast horizon, in one call
+    end = (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=SOLAR_FORECAST_DAYS - 1)).strftime("%Y-%m-%d")
+    url = (
+        f"{OPEN_METEO_URL}/v1/forecast?"
+        f"latitude={lat}&longitude={lon}&hourly=shortwave_radiation&start_date={day}&end_date={end}&timezone=Europe/Madrid"
+    )
+    return parsed(parse_solar_radiation, get_json(url))
@@ -0,0 +1,112 @@
+# Headless fetch-and-score pipeline, e.g. for a nightly cron job.
+#
+# Reuses the app's fetchers and scoring functions without importing
+# Streamlit. API keys come from the OPENWEATHER_API_KEY and
+# ELECTRICITYMAP_API_KEY environment variables.
+#
+#   python batch.py --all --zone ES --out scores.csv
+#   python batch.py --cities Madrid Bilbao --out scores.parquet --workers 4
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import is_stale
+from cities import city_options
+from fetch import fetch_city_data
+from forecast import FORECAST_DAYS, daily_aggregates, forecast_frame
+from ratelimit import LIMITERS
+from scoring import HEATING_TYPES, energy_column, score_frame
+
+log = logging.getLogger("batch")
+
+DEFAULT_WORKERS = 8
+# Batch runs queue behind each provider's quota instead of dropping cities
+DEFAULT_MAX_WAIT = 120
+# Only what the output uses: no solar radiation or power-breakdown history
+BATCH_SOURCES = ("current_weather", "forecast", "air_quality", "carbon")
+# Without these the fetchers would fall back to Streamlit secrets
+REQUIRED_ENV = ("OPENWEATHER_API_KEY", "ELECTRICITYMAP_API_KEY")
+
+
+def city_rows(city, zone):
+    # One row per forecast day: temperature aggregates plus the inputs the
+    # scores need. Returns None when the city has no weather data.
+    data = fetch_city_data(city, zone, BATCH_SOURCES)
+    if not data["current_weather"] or not data["forecast"]:
+        log.warning("no weather data for %s", city)
+        return None
+    daily = daily_aggregates(forecast_frame(data["forecast"]), days=FORECAST_DAYS)
+    daily.insert(0, "city", city)
+    daily.insert(1, "zone", zone)
+    daily["current_temp"] = data["current_weather"].temp
+    daily["aqi"] = data["air_quality"].aqi if data["air_quality"] else None
+    daily["carbon_intensity"] = data["carbon"].intensity if data["carbon"] else None
+    daily["stale"] = any(is_stale(value) for value in data.values())
+    return daily
+
+
+def run_batch(cities, zone, workers=DEFAULT_WORKERS):
+    # Returns (scored DataFrame, cities without data)
+    import pandas as pd
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        results = list(pool.map(lambda city: city_rows(city, zone), cities))
+
+    frames = [frame for frame in results if frame is not None]
+    missing = [city for city, frame in zip(cities, results) if frame is None]
+    if not frames:
+        return pd.DataFrame(), missing
+    df = pd.concat(frames, ignore_index=True)
+    df = df.astype({"aqi": float, "carbon_intensity": float})
+    # Daily score from the forecast mean temperature, vectorized over every row
+    return score_frame(df, temp_col="temp_mean"), missing
+
+
+def write_output(df, path):
+    if path.endswith(".parquet"):
+        try:
+            df.to_parquet(path, index=False)
+        except ImportError as exc:
+            raise SystemExit(f"Writing Parquet needs pyarrow or fastparquet installed: {exc}")
+    else:
+        df.to_csv(path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch and score cities without Streamlit.")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--cities", nargs="+", help="cities to score")
+    selection.add_argument("--all", action="store_true", help="score Madrid and every city in the app's list")
+    parser.add_argument("--zone", default="ES", help="ElectricityMap zone (default: ES)")
+    parser.add_argument("--out", required=True, help="output file, .csv or .parquet")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="cities fetched in parallel")
+    parser.add_argument("--max-wait", type=float, default=DEFAULT_MAX_WAIT,
+                        help="seconds a call may wait for the provider rate limit")
+    args = parser.parse_args(argv)
+    missing_env = [name for name in REQUIRED_ENV if not os.environ.get(name)]
+    if missing_env:
+        raise SystemExit(f"batch.py: set {' and '.join(missing_env)} in the environment")
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    for limiter in LIMITERS.values():
+        limiter.max_wait = args.max_wait
+
+    cities = ["Madrid"] + city_options if args.all else args.cities
+    cities = list(dict.fromkeys(cities))
+    df, missing = run_batch(cities, args.zone, workers=args.workers)
+    if df.empty:
+        log.error("no city could be scored")
+        return 1
+    columns = ["city", "zone", "date", "temp_mean", "temp_min", "temp_max", "heating_degree_hours", "current_temp",
+               "aqi", "carbon_intensity", *(energy_column(h) for h in HEATING_TYPES), "score", "stale"]
+    write_output(df[columns], args.out)
+    log.info("wrote %d rows for %d cities to %s", len(df), df["city"].nunique(), args.out)
+    if missing:
+        log.warning("no data for %d cities: %s", len(missing), ", ".join(missing))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# Memory held per cached city: raw API JSON versus the parsed records.
+#
+# Uses the recorded responses in benchmarks/fixtures. "per city" covers what
+# the caches keep for each city (current weather, forecast, air quality,
+# solar radiation); "per zone" what is shared by every city of a zone
+# (carbon intensity, power-breakdown history).
+#
+#   python benchmarks/bench_memory.py [--cities 138]
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+sys.path.insert(0, ROOT)
+
+from records import (  # noqa: E402
+    parse_air_quality,
+    parse_carbon_intensity,
+    parse_current_weather,
+    parse_forecast,
+    parse_power_history,
+    parse_solar_radiation,
+)
+
+PER_CITY = {
+    "current weather": ("openweather_weather", parse_current_weather),
+    "forecast": ("openweather_forecast", parse_forecast),
+    "air quality": ("openweather_air_pollution", parse_air_quality),
+    "solar radiation": ("open_meteo_forecast", parse_solar_radiation),
+}
+PER_ZONE = {
+    "carbon intensity": ("electricitymap_carbon_intensity", lambda payload: parse_carbon_intensity(payload, "ES")),
+    "power history": ("electricitymap_power_breakdown_history", lambda payload: parse_power_history(payload, "ES")),
+}
+
+
+def deep_size(value, seen=None):
+    # Bytes reachable from value, counting shared objects once. NumPy arrays
+    # report their buffer in sys.getsizeof when they own it.
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in value)
+    elif hasattr(value, "__slots__"):
+        size += sum(deep_size(getattr(value, name), seen) for name in value.__slots__)
+    return size
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name + ".json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def measure(group):
+    rows = []
+    for label, (fixture, parse) in group.items():
+        payload = load(fixture)
+        rows.append((label, deep_size(payload), deep_size(parse(payload))))
+    return rows
+
+
+def report(title, rows):
+    raw_total = sum(raw for _, raw, _ in rows)
+    record_total = sum(record for _, _, record in rows)
+    print(f"{title}")
+    for label, raw, record in rows + [("total", raw_total, record_total)]:
+        print(f"  {label:<18} raw JSON {raw / 1024:8.1f} KiB   records {record / 1024:7.1f} KiB   {raw / record:5.1f}x")
+    return raw_total, record_total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cities", type=int, default=138, help="cities cached in one zone")
+    args = parser.parse_args()
+
+    city_raw, city_records = report("per city", measure(PER_CITY))
+    zone_raw, zone_records = report("per zone", measure(PER_ZONE))
+    raw = args.cities * city_raw + zone_raw
+    records = args.cities * city_records + zone_records
+    print(f"{args.cities} cities in one zone: raw JSON {raw / 2**20:.1f} MiB, records {records / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Cold-start benchmark for streamlit_app.py, before and after.
+#
+# Each sample runs in a fresh interpreter, the way a new server process
+# starts, and times the first script run (before Analyze) through
+# Streamlit's AppTest. It also lists which heavy stacks that run loaded
+# itself (AppTest pulls in some of them on its own, so those are excluded).
+# "baseline" runs streamlit_app.py as of --baseline (the original app that
+# imported everything up front), "current" the one in the working tree.
+#
+#   python benchmarks/bench_startup.py [--runs 5] [--baseline 8e033b1]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "matplotlib.pyplot", "plotly.graph_objects", "seaborn"]
+BASELINE_REV = "8e033b1"
+
+FIRST_PAINT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=60)
+at.secrets["OPENWEATHER_API_KEY"] = "bench"
+at.secrets["ELECTRICITYMAP_API_KEY"] = "bench"
+preloaded = set(sys.modules)
+start = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - start
+assert not at.exception, at.exception
+loaded = [m for m in {heavy!r} if m in sys.modules and m not in preloaded]
+print(json.dumps({{"seconds": elapsed, "loaded": loaded}}))
+"""
+
+
+def sample(code, cwd):
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=cwd
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(name, root, app, runs):
+    code = FIRST_PAINT.format(root=root, app=app, heavy=HEAVY_MODULES)
+    samples = [sample(code, root) for _ in range(runs)]
+    seconds = [s["seconds"] for s in samples]
+    print(f"{name:<18} median {statistics.median(seconds) * 1000:8.1f} ms   "
+          f"min {min(seconds) * 1000:8.1f} ms   loaded: {', '.join(samples[-1]['loaded']) or '-'}")
+    return statistics.median(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_REV, help="git revision of the app to compare against")
+    args = parser.parse_args()
+
+    # The baseline app is a single self-contained script, so it runs from a
+    # scratch directory without the modules added since
+    source = subprocess.run(
+        ["git", "show", f"{args.baseline}:streamlit_app.py"], capture_output=True, text=True, check=True, cwd=ROOT
+    ).stdout
+    with tempfile.TemporaryDirectory() as scratch:
+        baseline_app = os.path.join(scratch, "streamlit_app.py")
+        with open(baseline_app, "w", encoding="utf-8") as f:
+            f.write(source)
+        before = run(f"baseline {args.baseline}", scratch, baseline_app, args.runs)
+    after = run("current", ROOT, os.path.join(ROOT, "streamlit_app.py"), args.runs)
+    print(f"first paint {before * 1000:.1f} ms -> {after * 1000:.1f} ms ({before / after:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# Load test for streamlit_app.py against the local API stub.
+#
+# Starts benchmarks/stub_server.py in a subprocess, points the app at it and
+# drives N concurrent simulated users through Streamlit's AppTest. Each
+# session opens the app, runs Analyze for a random city and switches through
+# a few tabs. AppTest swaps process-wide Streamlit state on every run, so
+# each user runs in its own process (one server replica per user).
+#
+# Reports throughput, p50/p99 latency of Analyze and of tab reruns, upstream
+# calls per session and process memory growth per rerun.
+#
+#   python benchmarks/load_test.py --users 8 --sessions 4 --latency 150 --jitter 50
+#   python benchmarks/load_test.py --users 4 --error-rate 0.05 --throttle-rate 0.02
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "streamlit_app.py")
+STUB = os.path.join(ROOT, "benchmarks", "stub_server.py")
+# Upper bound for warm-up and for a whole user's run, in seconds
+WORKER_TIMEOUT = 600
+
+
+def start_stub(args):
+    command = [sys.executable, STUB, "--port", "0", "--latency", str(args.latency), "--jitter", str(args.jitter),
+               "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate),
+               "--seed", str(args.seed)]
+    stub = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    url = stub.stdout.readline().split()[-1]
+    return stub, url
+
+
+def stub_stats(url):
+    with urllib.request.urlopen(url + "/__stats") as response:
+        return json.load(response)
+
+
+def rss_bytes():
+    # Current resident set size; peak RSS where /proc is not available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def session(seed, cities, tabs, results):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    city = rng.choice(cities)
+    at.selectbox[0].set_value(city)
+
+    start = time.perf_counter()
+    at.button(key="analyze_button").click().run()
+    results["analyze"].append(time.perf_counter() - start)
+    if at.exception:
+        results["failures"].append(f"{city}: {at.exception[0].message}")
+        return
+
+    labels = [tab.label for tab in at.tabs]
+    for label in rng.sample(labels[1:], k=min(tabs, len(labels) - 1)):
+        at.session_state["analysis_tab"] = label
+        start = time.perf_counter()
+        at.run()
+        results["rerun"].append(time.perf_counter() - start)
+        if at.exception:
+            results["failures"].append(f"{city} / {label}: {at.exception[0].message}")
+    results["reruns"] += 2 + min(tabs, len(labels) - 1)
+
+
+def user(index, args, barrier, queue):
+    # One simulated user per process: sessions run one after another and
+    # share this process's caches, like sessions on one server replica
+    sys.path.insert(0, ROOT)
+    from cities import city_options
+
+    cities = ["Madrid"] + city_options
+    results = {"analyze": [], "rerun": [], "failures": [], "reruns": 0}
+    # Warm-up session so imports and first-run setup are not measured
+    session(-1 - index, ["Madrid"], 0, {"analyze": [], "rerun": [], "failures": [], "reruns": 0})
+    gc.collect()
+    rss_start = rss_bytes()
+    barrier.wait()
+    for n in range(args.sessions):
+        session(args.seed * 100_000 + index * 1000 + n, cities, args.tabs, results)
+    gc.collect()
+    results["rss_growth"] = rss_bytes() - rss_start
+    queue.put(results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=8, help="concurrent users, one process each")
+    parser.add_argument("--sessions", type=int, default=3, help="sessions run by each user")
+    parser.add_argument("--tabs", type=int, default=3, help="tabs opened per session after Analyze")
+    parser.add_argument("--latency", type=float, default=100, help="stub latency per request, ms")
+    parser.add_argument("--jitter", type=float, default=50, help="stub latency jitter, ms")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--prefetch", action="store_true", help="keep the background prefetch scheduler on")
+    args = parser.parse_args()
+
+    stub, url = start_stub(args)
+    scratch = tempfile.mkdtemp(prefix="load_test_")
+    os.environ.update({
+        "OPENWEATHER_BASE_URL": url,
+        "ELECTRICITYMAP_BASE_URL": url,
+        "OPEN_METEO_BASE_URL": url,
+        "OPENWEATHER_API_KEY": "stub",
+        "ELECTRICITYMAP_API_KEY": "stub",
+        "POWER_STORE_PATH": os.path.join(scratch, "power_history.sqlite3"),
+        "GEOCODE_CACHE_PATH": os.path.join(scratch, "geocode_cache.json"),
+    })
+    if not args.prefetch:
+        os.environ["PREFETCH_TOP_N"] = "0"
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.users + 1)
+    queue = context.Queue()
+    workers = [context.Process(target=user, args=(index, args, barrier, queue)) for index in range(args.users)]
+    try:
+        for worker in workers:
+            worker.start()
+        barrier.wait(timeout=WORKER_TIMEOUT)
+        before = stub_stats(url)
+        start = time.perf_counter()
+        results = [queue.get(timeout=WORKER_TIMEOUT) for _ in workers]
+        elapsed = time.perf_counter() - start
+        after = stub_stats(url)
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        stub.terminate()
+        stub.wait()
+
+    total = args.users * args.sessions
+    analyze = [seconds for result in results for seconds in result["analyze"]]
+    rerun = [seconds for result in results for seconds in result["rerun"]]
+    failures = [failure for result in results for failure in result["failures"]]
+    reruns = sum(result["reruns"] for result in results)
+    rss_growth = sum(result["rss_growth"] for result in results) / len(results)
+    reruns_per_user = reruns / len(results)
+
+    calls = {name: after.get(name, 0) - before.get(name, 0) for name in after}
+    upstream = sum(count for name, count in calls.items() if not name.startswith(("injected", "not_found")))
+    print(f"sessions       {total} ({args.users} concurrent), {elapsed:.1f} s, "
+          f"{total / elapsed:.2f} sessions/s, {reruns / elapsed:.2f} reruns/s")
+    for kind, samples in (("analyze", analyze), ("rerun", rerun)):
+        if samples:
+            print(f"{kind:<14} p50 {percentile(samples, 0.5) * 1000:8.1f} ms   "
+                  f"p99 {percentile(samples, 0.99) * 1000:8.1f} ms   "
+                  f"mean {statistics.mean(samples) * 1000:8.1f} ms   n={len(samples)}")
+    print(f"upstream calls {upstream / total:.2f} per session ({upstream} total)")
+    for name, count in sorted(calls.items()):
+        print(f"  {name:<40} {count}")
+    print(f"memory         {rss_growth / 1024:+.0f} KiB RSS per user process over {reruns_per_user:.0f} reruns "
+          f"({rss_growth / max(reruns_per_user, 1) / 1024:+.1f} KiB per rerun)")
+    if failures:
+        print(f"{len(failures)} failed runs, e.g. {failures[0]}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
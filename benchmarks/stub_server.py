@@ -0,0 +1,238 @@
+# Local stand-in for the OpenWeather, ElectricityMap and Open-Meteo endpoints
+# the app calls. Replays the recorded responses in benchmarks/fixtures with
+# their timestamps moved to the present, so no API keys or network are needed.
+#
+#   python benchmarks/stub_server.py --port 8765 --latency 120 --error-rate 0.02 --throttle-rate 0.01
+#
+# Then point the app at it:
+#
+#   OPENWEATHER_BASE_URL=http://127.0.0.1:8765 ELECTRICITYMAP_BASE_URL=http://127.0.0.1:8765 \
+#   OPEN_METEO_BASE_URL=http://127.0.0.1:8765 OPENWEATHER_API_KEY=stub ELECTRICITYMAP_API_KEY=stub \
+#   streamlit run streamlit_app.py
+#
+# GET /__stats returns request counts per endpoint and injected failures.
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+sys.path.insert(0, ROOT)
+
+from geocode import lookup  # noqa: E402
+
+ENDPOINTS = {
+    "/data/2.5/weather": "openweather_weather",
+    "/data/2.5/forecast": "openweather_forecast",
+    "/data/2.5/air_pollution": "openweather_air_pollution",
+    "/v3/carbon-intensity/latest": "electricitymap_carbon_intensity",
+    "/v3/power-breakdown/history": "electricitymap_power_breakdown_history",
+    "/v1/forecast": "open_meteo_forecast",
+}
+EM_FORMAT = "%Y-%m-%dT%H:00:00.000Z"
+
+
+def load_fixtures():
+    fixtures = {}
+    for name in ENDPOINTS.values():
+        with open(os.path.join(FIXTURES, name + ".json"), encoding="utf-8") as f:
+            fixtures[name] = json.load(f)
+    return fixtures
+
+
+def _hour(now):
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+# Replayers: recorded body + query -> body as the live API would send it now
+def weather(body, query, now):
+    city = query.get("q", [body["name"]])[0]
+    coords = lookup(city)
+    if coords:
+        body["coord"] = {"lat": coords[0], "lon": coords[1]}
+    body["name"] = city
+    body["dt"] = int(now.timestamp())
+    return body
+
+
+def forecast(body, query, now):
+    # 3-hourly slots starting at the next multiple of 3h (UTC)
+    start = _hour(now) + timedelta(hours=3 - now.hour % 3)
+    for i, entry in enumerate(body["list"]):
+        slot = start + timedelta(hours=3 * i)
+        entry["dt"] = int(slot.timestamp())
+        entry["dt_txt"] = slot.strftime("%Y-%m-%d %H:%M:%S")
+    body["city"]["name"] = query.get("q", [body["city"]["name"]])[0]
+    return body
+
+
+def air_pollution(body, query, now):
+    body["coord"] = {"lat": float(query["lat"][0]), "lon": float(query["lon"][0])}
+    body["list"][0]["dt"] = int(now.timestamp())
+    return body
+
+
+def carbon_intensity(body, query, now):
+    body["zone"] = query.get("zone", [body["zone"]])[0]
+    body["datetime"] = _hour(now).strftime(EM_FORMAT)
+    return body
+
+
+def power_breakdown_history(body, query, now):
+    # Last 24 hours ending at the current hour, keeping the recorded hour-of-day shape
+    zone = query.get("zone", [body["zone"]])[0]
+    body["zone"] = zone
+    history = body["history"]
+    first = _hour(now) - timedelta(hours=len(history) - 1)
+    offset = (first.hour - datetime.fromisoformat(history[0]["datetime"].replace("Z", "+00:00")).hour) % len(history)
+    history[:] = history[offset:] + history[:offset]
+    for i, entry in enumerate(history):
+        entry["zone"] = zone
+        entry["datetime"] = (first + timedelta(hours=i)).strftime(EM_FORMAT)
+    return body
+
+
+def open_meteo(body, query, now):
+    # The recorded day repeated over start_date..end_date
+    first = query.get("start_date", [now.strftime("%Y-%m-%d")])[0]
+    last = query.get("end_date", [first])[0]
+    days = (datetime.strptime(last, "%Y-%m-%d") - datetime.strptime(first, "%Y-%m-%d")).days + 1
+    hourly = body["hourly"]
+    start = datetime.strptime(first, "%Y-%m-%d")
+    body["latitude"], body["longitude"] = float(query["latitude"][0]), float(query["longitude"][0])
+    hourly["time"] = [(start + timedelta(hours=hour)).strftime("%Y-%m-%dT%H:%M") for hour in range(24 * days)]
+    hourly["shortwave_radiation"] = hourly["shortwave_radiation"] * days
+    return body
+
+
+REPLAYERS = {
+    "openweather_weather": weather,
+    "openweather_forecast": forecast,
+    "openweather_air_pollution": air_pollution,
+    "electricitymap_carbon_intensity": carbon_intensity,
+    "electricitymap_power_breakdown_history": power_breakdown_history,
+    "open_meteo_forecast": open_meteo,
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 unknown_cities=(), seed=None):
+        super().__init__(address, StubHandler)
+        self.fixtures = load_fixtures()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.unknown_cities = {city.casefold() for city in unknown_cities}
+        self.random = random.Random(seed)
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def draw(self):
+        with self.lock:
+            return self.random.random(), self.random.uniform(-self.jitter, self.jitter)
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        if parts.path == "/__stats":
+            return self.send_json(200, server.stats())
+        if parts.path == "/__reset":
+            server.reset()
+            return self.send_json(200, {})
+        name = ENDPOINTS.get(parts.path)
+        if name is None:
+            return self.send_json(404, {"message": "unknown endpoint"})
+        query = parse_qs(parts.query)
+        server.count(name)
+
+        roll, jitter = server.draw()
+        time.sleep(max(0.0, server.latency + jitter))
+        if roll < server.throttle_rate:
+            server.count("injected_429")
+            return self.send_json(429, {"message": "Too many requests"}, [("Retry-After", "1")])
+        if roll < server.throttle_rate + server.error_rate:
+            server.count("injected_500")
+            return self.send_json(500, {"message": "Internal error"})
+        if query.get("q", [""])[0].casefold() in server.unknown_cities:
+            server.count("not_found")
+            return self.send_json(404, {"cod": "404", "message": "city not found"})
+
+        body = copy.deepcopy(server.fixtures[name])
+        self.send_json(200, REPLAYERS[name](body, query, datetime.now(timezone.utc)))
+
+
+def start(port=0, **options):
+    # Serves on 127.0.0.1 from a daemon thread; returns the server
+    server = StubServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded API responses locally.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0, help="added latency per request, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="uniform +/- jitter on the latency, ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered 500")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="share of requests answered 429")
+    parser.add_argument("--unknown-city", action="append", default=[], help="city answered 404 (repeatable)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = StubServer(("127.0.0.1", args.port), latency=args.latency / 1000, jitter=args.jitter / 1000,
+                        error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                        unknown_cities=args.unknown_city, seed=args.seed)
+    print(f"stub listening on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
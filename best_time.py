@@ -0,0 +1,216 @@
+# Best time to use energy over the forecast horizon.
+#
+# For each city a table with one row per upcoming hour combines the
+# interpolated forecast temperature, Open-Meteo shortwave radiation and the
+# grid's carbon intensity pattern (estimated from the stored power
+# breakdown and scaled to the latest measured intensity), scored with
+# scoring.score_hours_array. Tables are cached per (city, zone) and only the
+# columns whose inputs changed are recomputed; best_window() then answers
+# "best N-hour window in the next X days" from the table.
+import hashlib
+
+import geocode
+import power_store
+from api import (
+    get_carbon_intensity,
+    get_current_weather,
+    get_power_breakdown_history,
+    get_solar_radiation,
+    get_weather_forecast,
+)
+from cache import CACHES, TTLCache, city_key, zone_key
+from forecast import FORECAST_DAYS, forecast_frame, hourly_frame
+from scoring import score_hours_array
+
+HORIZON_DAYS = FORECAST_DAYS
+# Days of stored power breakdown averaged into the hour-of-day grid pattern
+PROFILE_DAYS = 7
+# Local time the solar radiation is reported in and windows are shown in
+TIMEZONE = "Europe/Madrid"
+TABLE_TTL = 6 * 60 * 60
+
+# Lifecycle emission factors (gCO₂eq/kWh, IPCC 2014 medians) per
+# ElectricityMap breakdown source; sources not listed count as UNKNOWN_FACTOR
+EMISSION_FACTORS = {
+    "biomass": 230,
+    "coal": 820,
+    "gas": 490,
+    "geothermal": 38,
+    "hydro": 24,
+    "hydro discharge": 24,
+    "nuclear": 12,
+    "oil": 650,
+    "solar": 45,
+    "wind": 11,
+}
+UNKNOWN_FACTOR = 700
+RENEWABLE_SOURCES = ("biomass", "geothermal", "hydro", "solar", "wind")
+
+_tables = TTLCache("best_time", ttl=TABLE_TTL, maxsize=256, max_stale=0)
+CACHES[_tables.name] = _tables
+# Power history object last written to the store, per zone
+_ingested = {}
+
+
+def grid_profile(zone, days=PROFILE_DAYS, path=None):
+    # Mean estimated carbon intensity and renewable share per UTC hour of
+    # day (index 0-23) over the stored history, or None without data
+    import pandas as pd
+
+    power = power_store.query_last(zone, days, path=path)
+    if power.empty:
+        return None
+    power = power.clip(lower=0).fillna(0)
+    total = power.sum(axis=1)
+    factors = pd.Series({source: EMISSION_FACTORS.get(source, UNKNOWN_FACTOR) for source in power.columns})
+    renewable = power.columns.intersection(RENEWABLE_SOURCES)
+    hourly = pd.DataFrame({
+        "carbon": power.mul(factors).sum(axis=1) / total,
+        "renewable_pct": power[renewable].sum(axis=1) / total * 100,
+    })[total > 0]
+    if hourly.empty:
+        return None
+    return hourly.groupby(hourly.index.hour).mean().reindex(range(24)).interpolate(limit_direction="both")
+
+
+def _fingerprint(value):
+    import numpy as np
+    import pandas as pd
+
+    if value is None:
+        return None
+    digest = hashlib.sha1()
+    if isinstance(value, pd.DataFrame):
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif hasattr(value, "__slots__"):
+        for name in value.__slots__:
+            if name != "stale_since":
+                part = getattr(value, name)
+                digest.update(part.tobytes() if isinstance(part, np.ndarray) else repr(part).encode())
+    else:
+        digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+
+def _hours(forecast):
+    # Hourly UTC index over the forecast span with the interpolated temperature
+    return hourly_frame(forecast_frame(forecast))[["temp"]].copy()
+
+
+def _shortwave(solar, index):
+    # Radiation per UTC hour; hours past the fetched days reuse the mean of
+    # the same local hour, and no data at all counts as no sun
+    import numpy as np
+    import pandas as pd
+
+    if not solar:
+        return np.zeros(len(index))
+    local = pd.DatetimeIndex(solar.times).tz_localize(TIMEZONE, ambiguous="NaT", nonexistent="NaT")
+    series = pd.Series(solar.shortwave.astype(float), index=local.tz_convert("UTC"))
+    series = series[series.index.notna()].groupby(level=0).mean()
+    values = series.reindex(index)
+    by_hour = series.groupby(series.index.tz_convert(TIMEZONE).hour).mean()
+    fallback = by_hour.reindex(index.tz_convert(TIMEZONE).hour).to_numpy()
+    return values.fillna(pd.Series(fallback, index=index)).fillna(0).to_numpy()
+
+
+def _grid(profile, carbon, index):
+    # (carbon intensity, renewable share) per UTC hour. The hour-of-day
+    # pattern is scaled so the current hour matches the measured intensity.
+    import numpy as np
+    import pandas as pd
+
+    intensity = carbon.intensity if carbon else None
+    if profile is None:
+        flat = np.full(len(index), np.nan if intensity is None else intensity)
+        return flat, np.full(len(index), np.nan)
+    pattern = profile.reindex(index.hour)
+    scale = 1.0
+    baseline = profile["carbon"].iloc[pd.Timestamp.now(tz="UTC").hour]
+    if intensity is not None and baseline > 0:
+        scale = intensity / baseline
+    return pattern["carbon"].to_numpy() * scale, pattern["renewable_pct"].to_numpy()
+
+
+def refresh_index(city, zone, forecast, solar, carbon, profile=None):
+    # Returns the hourly table for (city, zone), recomputing only the columns
+    # whose input changed since the cached table was built
+    if not forecast:
+        return None
+    if profile is None:
+        profile = grid_profile(zone)
+    return _refresh(city, zone, forecast, solar, carbon, profile)
+
+
+def _refresh(city, zone, forecast, solar, carbon, profile):
+    key = city_key(city) + zone_key(zone)
+    inputs = {"forecast": forecast, "solar": solar, "carbon": carbon, "profile": profile}
+    tokens = {name: _fingerprint(value) for name, value in inputs.items()}
+
+    found, entry = _tables.get(key)
+    if found and entry["tokens"] == tokens:
+        return entry["table"]
+    changed = {name for name in tokens if not found or entry["tokens"][name] != tokens[name]}
+    if not found or "forecast" in changed:
+        table = _hours(forecast)
+        changed = set(tokens)
+    else:
+        table = entry["table"].copy()
+
+    if "solar" in changed:
+        table["shortwave"] = _shortwave(solar, table.index)
+    if changed & {"carbon", "profile"}:
+        table["carbon"], table["renewable_pct"] = _grid(profile, carbon, table.index)
+    table["score"] = score_hours_array(table["carbon"], table["shortwave"], table["temp"])
+    _tables.set(key, {"tokens": tokens, "table": table})
+    return table
+
+
+def zone_profile(zone):
+    # Stores the cached power history unless that same object was already
+    # stored, then returns the zone's grid profile; never calls upstream
+    power_history = get_power_breakdown_history.peek(zone)
+    if power_history and _ingested.get(zone) is not power_history:
+        power_store.ingest(zone, power_history)
+        _ingested[zone] = power_history
+    return grid_profile(zone)
+
+
+def refresh_cached(city, zone, profile):
+    # Rebuilds a city's table from whatever the caches hold and the zone's
+    # profile from zone_profile(), never calling upstream; used by the
+    # prefetch scheduler after each pass
+    forecast = get_weather_forecast.peek(city)
+    if not forecast:
+        return None
+    coords = geocode.lookup(city)
+    if coords is None:
+        current_weather = get_current_weather.peek(city)
+        coords = (current_weather.lat, current_weather.lon) if current_weather else None
+    solar = get_solar_radiation.peek(*coords) if coords else None
+    return _refresh(city, zone, forecast, solar, get_carbon_intensity.peek(zone), profile)
+
+
+def upcoming_scores(table, days=1, now=None):
+    # Scores from the current hour up to `days` days ahead
+    import pandas as pd
+
+    now = pd.Timestamp.now(tz="UTC").floor("h") if now is None else now
+    return table["score"].loc[now:now + pd.Timedelta(days=days) - pd.Timedelta(hours=1)].dropna()
+
+
+def best_window(table, hours=3, days=1, now=None):
+    # (start, end, mean score) of the best `hours` consecutive hours that
+    # start now or later and end within `days` days, None if none fit
+    import pandas as pd
+
+    if table is None:
+        return None
+    upcoming = upcoming_scores(table, days, now)
+    if len(upcoming) < hours:
+        return None
+    # Rolling means are labelled with the window's last hour
+    means = upcoming.rolling(hours).mean().dropna()
+    last = means.idxmax()
+    start = last - pd.Timedelta(hours=hours - 1)
+    return start, last + pd.Timedelta(hours=1), float(means.max())
@@ -0,0 +1,315 @@
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import replace
+from functools import wraps
+
+import metrics
+
+# Process-wide caches shared by every Streamlit session, by name
+CACHES = {}
+
+# Grid used to snap coordinates so nearby requests share one cache entry
+COORD_GRID = 0.05
+
+# How long an expired entry may still be served while it is refreshed
+MAX_STALE = 24 * 60 * 60
+# Longest a background refresh waits for its provider's rate limiter
+MAX_REFRESH_WAIT = 5 * 60
+# Key added to the copy of a dict response served past its TTL
+STALE_FLAG = "_stale_since"
+
+REFRESH_WORKERS = 4
+
+log = logging.getLogger("cache")
+
+# Background refreshes run on daemon threads: a refresh waiting for its
+# limiter must never keep the process (batch runs, tests) from exiting
+_refresh_queue = queue.Queue()
+_refresh_threads = []
+_refresh_lock = threading.Lock()
+
+
+def _refresh_worker():
+    while True:
+        fn, args = _refresh_queue.get()
+        try:
+            fn(*args)
+        except Exception:
+            log.exception("background refresh failed")
+
+
+def _submit_refresh(fn, *args):
+    with _refresh_lock:
+        if not _refresh_threads:
+            for i in range(REFRESH_WORKERS):
+                thread = threading.Thread(target=_refresh_worker, name=f"refresh_{i}", daemon=True)
+                thread.start()
+                _refresh_threads.append(thread)
+    _refresh_queue.put((fn, args))
+
+
+class SingleFlight:
+    # Deduplicates concurrent calls: while a call for a key is in flight,
+    # other callers with the same key wait for its result instead
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            value = fn(*args)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class TTLCache:
+    def __init__(self, name, ttl, maxsize=256, max_stale=MAX_STALE):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_stale = max_stale
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_served = 0
+        # Coalesces concurrent loads of the same missing key
+        self.flight = SingleFlight()
+        self._refreshing = set()
+
+    def get(self, key):
+        # Returns (found, value); expired entries count as misses but are
+        # kept for get_stale() until max_stale has passed
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                fresh_until, stale_until, _, value = entry
+                now = time.monotonic()
+                if fresh_until > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                if stale_until <= now:
+                    del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def get_stale(self, key):
+        # Last good value past its TTL, as a copy marked with when it was fetched
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            self.stale_served += 1
+            fetched_at, value = entry[2], entry[3]
+        return mark_stale(value, fetched_at)
+
+    def set(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (now + self.ttl, now + self.ttl + self.max_stale, time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def expires_in(self, key):
+        # Seconds until the entry stops being fresh (negative once expired),
+        # None when nothing is cached; does not count as a lookup
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            return entry[0] - time.monotonic()
+
+    def peek(self, key):
+        # Cached value, fresh or within its stale window, without counting a
+        # lookup or touching the LRU order; None when nothing is cached
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            return entry[3]
+
+    def start_refresh(self, key):
+        # Claims the key for a background refresh; False if one is already queued
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.flight.coalesced,
+                "stale_served": self.stale_served,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Key builders: they normalize the arguments and the fetcher is called with
+# the normalized values, so the cached answer never depends on who asked first
+def city_key(city):
+    return (" ".join(city.split()).casefold(),)
+
+
+def zone_key(zone):
+    return (zone.strip().upper(),)
+
+
+def snap_coord(value):
+    return round(round(float(value) / COORD_GRID) * COORD_GRID, 4)
+
+
+def grid_key(lat, lon):
+    return (snap_coord(lat), snap_coord(lon))
+
+
+def mark_stale(value, fetched_at):
+    # Copy of a cached value flagged with the wall-clock time it was fetched:
+    # dict payloads get STALE_FLAG, records (records.py) get stale_since
+    if isinstance(value, dict):
+        return dict(value, **{STALE_FLAG: fetched_at})
+    if hasattr(value, "stale_since"):
+        return replace(value, stale_since=fetched_at)
+    return value
+
+
+def stale_since(value):
+    # When a stale value was fetched, None for fresh values
+    if isinstance(value, dict):
+        return value.get(STALE_FLAG)
+    return getattr(value, "stale_since", None)
+
+
+def is_stale(value):
+    return stale_since(value) is not None
+
+
+def cached(name, ttl, key, maxsize=256, limiter=None):
+    # With a limiter, a call is only sent upstream when the provider's token
+    # bucket allows it. When the budget is spent or the upstream fails, the
+    # last good value is served marked stale and refreshed in the background.
+    cache = TTLCache(name, ttl, maxsize)
+    CACHES[name] = cache
+    flight = cache.flight
+
+    take_token = limiter.try_acquire if limiter is not None else None
+
+    def decorator(fn):
+        def load(cache_key, acquire=take_token):
+            # Only the caller that actually goes upstream spends a token;
+            # acquire is None when the caller already holds one
+            if acquire is not None and not acquire():
+                return None
+            start = time.perf_counter()
+            value = None
+            try:
+                value = fn(*cache_key)
+            finally:
+                metrics.record(f"fetch.{name}", time.perf_counter() - start, failed=value is None)
+            # Failed upstream calls are not cached so the next request retries
+            if value is not None:
+                cache.set(cache_key, value)
+            return value
+
+        def refresh(cache_key):
+            try:
+                if limiter is None or limiter.acquire(MAX_REFRESH_WAIT):
+                    flight.do(cache_key, load, cache_key, None)
+            finally:
+                cache.end_refresh(cache_key)
+
+        def serve_stale(cache_key):
+            stale = cache.get_stale(cache_key)
+            if stale is not None and cache.start_refresh(cache_key):
+                _submit_refresh(refresh, cache_key)
+            return stale
+
+        def prefetch(*args, lead=0, acquire=None):
+            # Reloads the entry ahead of time when it is missing or expires
+            # within `lead` seconds. acquire() replaces the limiter check so
+            # the caller can spend its own budget. Returns True if it reloaded.
+            cache_key = key(*args)
+            remaining = cache.expires_in(cache_key)
+            if remaining is not None and remaining > lead:
+                return False
+            if not cache.start_refresh(cache_key):
+                return False
+            try:
+                if acquire is not None and not acquire():
+                    return False
+                return flight.do(cache_key, load, cache_key, take_token if acquire is None else None) is not None
+            finally:
+                cache.end_refresh(cache_key)
+
+        def lookup(cache_key, acquire):
+            found, value = cache.get(cache_key)
+            if found:
+                return value
+            value = flight.do(cache_key, load, cache_key, acquire)
+            if value is None:
+                return serve_stale(cache_key)
+            return value
+
+        def fetch(*args, acquire=None):
+            # Like calling the fetcher, but acquire() replaces the limiter
+            # check, so bulk callers can wait on their own terms for a token
+            return lookup(key(*args), take_token if acquire is None else acquire)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return lookup(key(*args, **kwargs), take_token)
+
+        wrapper.cache = cache
+        wrapper.limiter = limiter
+        wrapper.prefetch = prefetch
+        wrapper.fetch = fetch
+        wrapper.peek = lambda *args: cache.peek(key(*args))
+        return wrapper
+
+    return decorator
+
+
+def cache_stats():
+    return [cache.stats() for cache in CACHES.values()]
@@ -0,0 +1,85 @@
+import hashlib
+import io
+
+import metrics
+from cache import CACHES, TTLCache
+
+# Rendered PNGs shared by every session, keyed by chart name and input hash
+CHART_TTL = 24 * 60 * 60
+MAX_CHARTS = 256
+# Same output options st.pyplot uses
+SAVEFIG_OPTIONS = {"format": "png", "bbox_inches": "tight", "dpi": 200}
+
+_images = TTLCache("chart_images", ttl=CHART_TTL, maxsize=MAX_CHARTS, max_stale=0)
+CACHES[_images.name] = _images
+
+
+def data_fingerprint(*parts):
+    import pandas as pd
+
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            labels = part.columns if isinstance(part, pd.DataFrame) else [part.name]
+            digest.update(repr(list(labels)).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=True).values.tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _rasterize(build, args):
+    import matplotlib.pyplot as plt
+
+    fig = build(*args)
+    try:
+        image = io.BytesIO()
+        fig.savefig(image, **SAVEFIG_OPTIONS)
+        return image.getvalue()
+    finally:
+        # Drop the figure from pyplot's registry so memory stays flat
+        plt.close(fig)
+
+
+def render_png(name, build, *args):
+    # build(*args) must return a new matplotlib Figure; it only runs when
+    # this chart has not been rendered for the same inputs yet
+    key = (name, data_fingerprint(*args))
+    found, png = _images.get(key)
+    if found:
+        return png
+
+    def load(key):
+        with metrics.timed(f"render.{name}"):
+            png = _rasterize(build, args)
+        _images.set(key, png)
+        return png
+
+    return _images.flight.do(key, load, key)
+
+
+# Downsampling for time-series charts sent to the browser
+CHART_WIDTH_PX = 700
+PX_PER_POINT = 2
+BUCKET_LADDER = ["1h", "2h", "3h", "6h", "12h", "1D", "2D", "7D"]
+
+
+def max_chart_points(width_px=CHART_WIDTH_PX):
+    return max(1, width_px // PX_PER_POINT)
+
+
+def downsample_mean(df, max_points=None):
+    # Averages a time-indexed frame into the smallest bucket from BUCKET_LADDER
+    # that keeps at most max_points rows. Missing values count as 0 so that
+    # the bucket means of the columns still add up to the mean stacked total.
+    import pandas as pd
+
+    max_points = max_points or max_chart_points()
+    if len(df) <= max_points:
+        return df
+    span = df.index[-1] - df.index[0]
+    for freq in BUCKET_LADDER:
+        if span / pd.Timedelta(freq) < max_points:
+            break
+    return df.fillna(0).resample(freq).mean().dropna(how="all")
@@ -0,0 +1,26 @@
+# Cities offered in the city selector (besides Madrid, which is listed first)
+city_options = [
+    "Barcelona", "Valencia", "Sevilla", "Zaragoza", "Palma",
+        "Las Palmas de Gran Canaria", "Bilbao", "Alicante", "Córdoba", "Valladolid", "Vigo",
+        "Gijón", "L'Hospitalet de Llobregat", "A Coruña", "Vitoria-Gasteiz", "Granada", "Elche",
+        "Oviedo", "Badalona", "Cartagena", "Terrassa", "Jerez de la Frontera", "Sabadell",
+        "Santa Cruz de Tenerife", "Móstoles", "Alcalá de Henares", "Fuenlabrada", "Pamplona",
+        "Almería", "Leganés", "San Sebastián", "Castellón de la Plana", "Burgos", "Santander",
+        "Albacete", "Getafe", "Alcorcón", "Logroño", "San Cristóbal de La Laguna", "Badajoz",
+        "Salamanca", "Huelva", "Marbella", "Lérida", "Tarragona", "León", "Dos Hermanas",
+        "Parla", "Mataró", "Cádiz", "Santa Coloma de Gramenet", "Jaén", "Igualada", "Teruel",
+        "Algeciras", "Reus", "Ourense", "Telde", "Baracaldo", "Málaga", "Torrejón de Ardoz", 
+        "Santiago de Compostela", "Lugo", "San Fernando", "Avilés", "Girona", 
+        "Melilla", "Toledo", "Lorca", "Ciudad Real", "Guadalajara", "Roquetas de Mar",
+        "Ceuta", "Pontevedra", "Rubí", "Manresa", "Ferrol", "Cuenca", 
+        "Benidorm", "Pozuelo de Alarcón", "Arrecife", "Murcia", "Chiclana de la Frontera", "Zamora",
+        "Talavera de la Reina", "Cáceres", "Valdepeñas", "Gavá", "Blanes",
+        "Majadahonda", "Orihuela", "Coslada", "Valdemoro", "Mollet del Vallès", "Sagunto",
+        "Collado Villalba", "Aranjuez", "Ávila", "Torremolinos", "Palencia", "Elda", 
+        "Granollers", "Villareal", "Motril", "Ibiza", "Puerto Real", "Soria", "Sanlúcar de Barrameda",
+        "Manacor", "Huesca", "Paterna", "Inca", "Segovia", "Denia", "Viladecans", "Antequera",
+        "Alcoy", "Rincón de la Victoria", "Figueras", "Cambrils", "Aranda de Duero", "Moncada y Reixach",
+        "Puertollano", "Ronda", "Cerdanyola del Vallès", "Estepona", "Gandía", "Torrevieja", "Irun",
+        "Vic", "Benalmádena", "Don Benito", "Lucena", "Villena", "El Ejido",
+        "Utrera", "Alcobendas", "San Sebastián de los Reyes"
+]
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import defaultdict
+
+from geocode import ALIASES, GAZETTEER, lookup, normalize_name
+
+# Typo-tolerant lookup over the bundled city names and their aliases, used
+# to check typed cities before any upstream call is made. The index only
+# knows ~140 cities, so an unknown name is never replaced: corrections are
+# offered next to it, and only when they look like a typo of it.
+MIN_SIMILARITY = 0.45
+MAX_SUGGESTIONS = 5
+# A correction scores at least this, has the same number of words and a
+# length this close
+TYPO_SIMILARITY = 0.6
+MAX_LENGTH_DIFF = 2
+# How long a name OpenWeather answered "city not found" for is rejected locally
+UNKNOWN_CITY_TTL = 24 * 60 * 60
+MAX_UNKNOWN_CITIES = 2048
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b):
+    # Optimal string alignment distance: insertions, deletions,
+    # substitutions and swaps of adjacent letters ("Madird") cost 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _similarity(key, grams, candidate, candidate_grams):
+    # Trigram (Dice) similarity, or the edit-distance one when it is higher:
+    # trigrams alone rate short transposed names too low
+    dice = 2 * len(grams & candidate_grams) / (len(grams) + len(candidate_grams))
+    edits = 1 - _edit_distance(key, candidate) / max(len(key), len(candidate))
+    return max(dice, edits)
+
+
+def is_typo_of(typed, city):
+    # Same word count and a similar length: "Madird" for Madrid, not
+    # "Sevilla la Nueva" for Sevilla
+    typed, city = normalize_name(typed), normalize_name(city)
+    return len(typed.split()) == len(city.split()) and abs(len(typed) - len(city)) <= MAX_LENGTH_DIFF
+
+
+class CityIndex:
+    def __init__(self, names):
+        # names: {display name: canonical city}
+        self._canonical = {}
+        self._grams = {}
+        self._postings = defaultdict(set)
+        for name, city in names.items():
+            key = normalize_name(name)
+            self._canonical.setdefault(key, city)
+            self._grams[key] = _trigrams(key)
+            for gram in self._grams[key]:
+                self._postings[gram].add(key)
+
+    def exact(self, name):
+        return self._canonical.get(normalize_name(name))
+
+    def suggest(self, name, limit=MAX_SUGGESTIONS):
+        # [(canonical city, score)] ranked by trigram (Dice) similarity to `name`
+        key = normalize_name(name)
+        grams = _trigrams(key)
+        candidates = set()
+        for gram in grams:
+            candidates.update(self._postings.get(gram, ()))
+        scored = {}
+        for candidate in candidates:
+            score = _similarity(key, grams, candidate, self._grams[candidate])
+            city = self._canonical[candidate]
+            if score >= MIN_SIMILARITY and score > scored.get(city, 0):
+                scored[city] = score
+        ranked = sorted(scored.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+INDEX = CityIndex({**{city: city for city in GAZETTEER}, **ALIASES})
+
+_unknown = {}
+_unknown_lock = threading.Lock()
+
+
+def mark_unknown(city):
+    # Called when the upstream reports the city does not exist
+    with _unknown_lock:
+        if len(_unknown) >= MAX_UNKNOWN_CITIES:
+            _unknown.pop(next(iter(_unknown)))
+        _unknown[normalize_name(city)] = time.monotonic() + UNKNOWN_CITY_TTL
+
+
+def is_known_bad(city):
+    key = normalize_name(city)
+    with _unknown_lock:
+        expires_at = _unknown.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del _unknown[key]
+            return False
+        return True
+
+
+def resolve(typed):
+    # Returns (city, suggestions). city is the canonical name for a known city
+    # or alias, the input itself when it is merely unknown (learned or small
+    # towns are fine), and None when it is empty or upstream said it does not
+    # exist. suggestions are the bundled cities the input looks like a typo of.
+    typed = " ".join(typed.split())
+    if not typed:
+        return None, []
+    city = INDEX.exact(typed)
+    if city:
+        return city, []
+    if lookup(typed):
+        return typed, []
+    suggestions = [name for name, score in INDEX.suggest(typed) if score >= TYPO_SIMILARITY and is_typo_of(typed, name)]
+    if is_known_bad(typed):
+        return None, suggestions
+    return typed, suggestions
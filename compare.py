@@ -0,0 +1,125 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import geocode
+from api import get_air_pollution, get_carbon_intensity, get_current_weather, get_power_breakdown_history
+from scoring import HEATING_TYPES, energy_column, score_frame
+
+# Upstream calls allowed in flight at once for one comparison
+COMPARE_CONCURRENCY = 8
+# Wall-clock budget (seconds) for a whole comparison; cities still pending
+# when it runs out are reported as unavailable instead of delaying the table.
+# Long lists get the time their spare OpenWeather quota needs, up to the cap.
+COMPARE_TIME_BUDGET = 20
+COMPARE_MAX_TIME_BUDGET = 5 * 60
+# Share of each provider bucket a comparison leaves for interactive users
+COMPARE_RESERVE = 0.5
+
+
+def _budget(fetcher, deadline):
+    # Token check for one comparison: waits for a spare token until the
+    # deadline instead of failing at once, never dipping into the reserve
+    limiter = fetcher.limiter
+    if limiter is None:
+        return None
+
+    def acquire():
+        # Past the deadline, calls still queued only use what is cached
+        timeout = deadline - time.monotonic()
+        return timeout > 0 and limiter.acquire(timeout, reserve=limiter.capacity * COMPARE_RESERVE)
+    return acquire
+
+
+def _call(fetcher, deadline, *args):
+    return fetcher.fetch(*args, acquire=_budget(fetcher, deadline))
+
+
+def _fetch_air_quality(city, weather_future, deadline):
+    # Bundled coordinates let the call start right away; other cities wait
+    # for their weather response to learn where they are
+    coords = geocode.lookup(city)
+    if coords is None:
+        current_weather = weather_future.result()
+        if not current_weather:
+            return None
+        coords = (current_weather.lat, current_weather.lon)
+    return _call(get_air_pollution, deadline, *coords)
+
+
+def time_budget(cities):
+    # Two OpenWeather calls per city: what the spare tokens do not cover
+    # arrives at the bucket's refill rate
+    limiter = get_current_weather.limiter
+    if limiter is None:
+        return COMPARE_TIME_BUDGET
+    spare = limiter.capacity * (1 - COMPARE_RESERVE)
+    needed = max(0, 2 * len(cities) - spare) / limiter.rate
+    return min(COMPARE_MAX_TIME_BUDGET, max(COMPARE_TIME_BUDGET, needed))
+
+
+def _result(future):
+    if future.done() and not future.cancelled() and not future.exception():
+        return future.result()
+    return None
+
+
+def compare_cities(cities, region, max_concurrency=COMPARE_CONCURRENCY, budget=None):
+    # Returns (ranked DataFrame, list of cities without data). The per-zone
+    # carbon and power data are fetched once and shared by every city.
+    import pandas as pd
+
+    cities = list(dict.fromkeys(cities))
+    deadline = time.monotonic() + (time_budget(cities) if budget is None else budget)
+    pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="compare")
+    try:
+        carbon_future = pool.submit(_call, get_carbon_intensity, deadline, region)
+        power_future = pool.submit(_call, get_power_breakdown_history, deadline, region)
+        # A city's weather call is queued before its air-quality call, which
+        # may wait on it, so that wait never blocks on work still queued
+        weather_futures = {}
+        air_futures = {}
+        for city in cities:
+            weather_futures[city] = pool.submit(_call, get_current_weather, deadline, city)
+            air_futures[city] = pool.submit(_fetch_air_quality, city, weather_futures[city], deadline)
+        futures = [carbon_future, power_future, *weather_futures.values(), *air_futures.values()]
+        wait(futures, timeout=max(0, deadline - time.monotonic()))
+    finally:
+        # Whatever is still queued is dropped; calls already running finish
+        # in the background and still warm the shared cache
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    carbon_data = _result(carbon_future)
+    power_history = _result(power_future)
+
+    rows = []
+    missing = []
+    for city in cities:
+        current_weather = _result(weather_futures[city])
+        if not current_weather:
+            missing.append(city)
+            continue
+        air_quality = _result(air_futures[city])
+        rows.append({"city": city, "temp": current_weather.temp, "aqi": air_quality.aqi if air_quality else None})
+
+    df = pd.DataFrame(rows, columns=["city", "temp", "aqi"])
+    df["carbon_intensity"] = carbon_data.intensity if carbon_data else None
+    df["renewable_pct"] = power_history.latest_renewable_pct() if power_history else None
+    scored = score_frame(df.astype({"temp": float, "aqi": float, "carbon_intensity": float}))
+    ranked = scored.sort_values(["score", "city"], ascending=[False, True], na_position="last")
+    ranked = ranked.reset_index(drop=True)
+    ranked.index += 1
+    return ranked, missing
+
+
+def comparison_table(ranked):
+    # Display names for the ranked comparison
+    columns = {
+        "city": "City",
+        "temp": "Temp (°C)",
+        **{energy_column(h): f"{h} (kWh)" for h in HEATING_TYPES},
+        "aqi": "AQI",
+        "carbon_intensity": "Carbon (gCO₂/kWh)",
+        "renewable_pct": "Renewable %",
+        "score": "Efficiency score",
+    }
+    return ranked[list(columns)].rename(columns=columns)
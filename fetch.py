@@ -0,0 +1,96 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import geocode
+from api import (
+    get_air_pollution,
+    get_carbon_intensity,
+    get_current_weather,
+    get_power_breakdown_history,
+    get_solar_radiation,
+    get_weather_forecast,
+)
+
+# One bounded pool for the whole server process, shared by every session
+MAX_FETCH_WORKERS = 16
+_executor = ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS, thread_name_prefix="fetch")
+# Everything one analysis shows
+SOURCES = ("current_weather", "forecast", "air_quality", "carbon", "power_history", "solar_radiation")
+
+
+def _chain(source, target, fn):
+    # Resolve `target` with fn(source result) once `source` finishes,
+    # without parking a pool worker while it waits
+    def on_done(done):
+        try:
+            value = done.result()
+        except Exception as exc:
+            target.set_exception(exc)
+            return
+        inner = _executor.submit(fn, value)
+        inner.add_done_callback(lambda f: _copy_result(f, target))
+
+    source.add_done_callback(on_done)
+
+
+def _copy_result(source, target):
+    try:
+        target.set_result(source.result())
+    except Exception as exc:
+        target.set_exception(exc)
+
+
+def _coords(current_weather):
+    if not current_weather:
+        return None
+    return current_weather.lat, current_weather.lon
+
+
+def _with_coords(fetcher):
+    def call(current_weather):
+        coords = _coords(current_weather)
+        return fetcher(*coords) if coords else None
+    return call
+
+
+def _remember_coords(city):
+    def on_done(done):
+        coords = None if done.exception() else _coords(done.result())
+        if coords:
+            geocode.remember(city, *coords)
+    return on_done
+
+
+def submit_city_fetch(city, region, sources=SOURCES):
+    # Start every independent call at once. Air pollution and solar radiation
+    # need lat/lon: from the gazetteer when the city is known, otherwise they
+    # wait for the current weather call and its coordinates are remembered.
+    # `sources` limits the calls to the data the caller will use.
+    direct = {
+        "current_weather": (get_current_weather, city),
+        "forecast": (get_weather_forecast, city),
+        "carbon": (get_carbon_intensity, region),
+        "power_history": (get_power_breakdown_history, region),
+    }
+    by_coords = {"air_quality": get_air_pollution, "solar_radiation": get_solar_radiation}
+    futures = {name: _executor.submit(fn, arg) for name, (fn, arg) in direct.items() if name in sources}
+    by_coords = {name: fn for name, fn in by_coords.items() if name in sources}
+    coords = geocode.lookup(city)
+    if coords:
+        for name, fetcher in by_coords.items():
+            futures[name] = _executor.submit(fetcher, *coords)
+    elif by_coords:
+        if "current_weather" not in futures:
+            futures["current_weather"] = _executor.submit(get_current_weather, city)
+        for name, fetcher in by_coords.items():
+            futures[name] = Future()
+            _chain(futures["current_weather"], futures[name], _with_coords(fetcher))
+        futures["current_weather"].add_done_callback(_remember_coords(city))
+    return futures
+
+
+def fetch_city_data(city, region, sources=SOURCES):
+    futures = submit_city_fetch(city, region, sources)
+    data = {name: future.result() for name, future in futures.items()}
+    coords = _coords(data.get("current_weather"))
+    data["lat"], data["lon"] = coords if coords else (None, None)
+    return data
@@ -0,0 +1,86 @@
+# Columnar view of the OpenWeather 5 day / 3 hour forecast.
+#
+# forecast_slots() turns the payload into typed columns in a single pass
+# (kept by records.Forecast) and forecast_frame() views them as a frame;
+# the daily and hourly aggregates are vectorized on top of it, so the page,
+# the batch job and the scores all read the same frame instead of walking
+# forecast_data['list'] again. pandas and numpy are imported on first use.
+from scoring import COMFORT_TEMP
+
+# Hours covered by one forecast slot
+SLOT_HOURS = 3
+FORECAST_DAYS = 5
+# Degree-hours are counted below the temperature the energy estimates use
+HEATING_BASE_TEMP = COMFORT_TEMP
+
+FORECAST_DTYPE = [
+    ("dt", "int64"),
+    ("temp", "float64"),
+    ("feels_like", "float64"),
+    ("humidity", "float32"),
+    ("wind_speed", "float32"),
+    ("wind_deg", "float32"),
+    ("clouds", "float32"),
+]
+
+
+def forecast_slots(forecast_data):
+    # Structured array of the payload's slots, built in a single pass
+    import numpy as np
+
+    return np.array([
+        (
+            entry['dt'],
+            entry['main']['temp'],
+            entry['main'].get('feels_like', np.nan),
+            entry['main'].get('humidity', np.nan),
+            entry.get('wind', {}).get('speed', np.nan),
+            entry.get('wind', {}).get('deg', np.nan),
+            entry.get('clouds', {}).get('all', np.nan),
+        )
+        for entry in forecast_data['list']
+    ], dtype=FORECAST_DTYPE)
+
+
+def forecast_frame(forecast):
+    # One row per 3-hour slot of a records.Forecast, indexed by UTC start time
+    import pandas as pd
+
+    frame = pd.DataFrame(forecast.slots)
+    frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop("dt"), unit="s", utc=True), name="timestamp")
+    return frame
+
+
+def heating_degree_hours(temps, hours=SLOT_HOURS, base=HEATING_BASE_TEMP):
+    import numpy as np
+
+    return np.maximum(0, base - np.asarray(temps, dtype=float)) * hours
+
+
+def daily_aggregates(frame, days=FORECAST_DAYS):
+    # First `days` UTC dates (the dates in the payload's dt_txt) with
+    # temperature statistics, mean conditions and heating degree-hours
+    slots = frame.assign(heating_degree_hours=heating_degree_hours(frame["temp"]))
+    dates = slots.index.strftime("%Y-%m-%d")
+    daily = slots.groupby(dates, sort=True).agg(
+        temp_mean=("temp", "mean"),
+        temp_min=("temp", "min"),
+        temp_max=("temp", "max"),
+        feels_like_mean=("feels_like", "mean"),
+        humidity_mean=("humidity", "mean"),
+        wind_speed_mean=("wind_speed", "mean"),
+        clouds_mean=("clouds", "mean"),
+        heating_degree_hours=("heating_degree_hours", "sum"),
+    )
+    daily.index.name = "date"
+    return daily.head(days).reset_index()
+
+
+def hourly_frame(frame):
+    # Slots interpolated to hourly values over the forecast span, with the
+    # heating degree-hours of each hour. Wind direction is carried forward
+    # since interpolating angles across north would be wrong.
+    hourly = frame.astype(float).resample("1h").interpolate(method="time")
+    hourly["wind_deg"] = frame["wind_deg"].resample("1h").ffill()
+    hourly["heating_degree_hours"] = heating_degree_hours(hourly["temp"], hours=1)
+    return hourly
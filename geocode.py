@@ -0,0 +1,238 @@
+import json
+import os
+import threading
+import unicodedata
+
+# Coordinates (lat, lon) for every city offered in the selector, so calls that
+# need coordinates can start without waiting for the current-weather call
+GAZETTEER = {
+    "Madrid": (40.42, -3.70),
+    "Barcelona": (41.39, 2.17),
+    "Valencia": (39.47, -0.38),
+    "Sevilla": (37.39, -5.98),
+    "Zaragoza": (41.65, -0.89),
+    "Palma": (39.57, 2.65),
+    "Las Palmas de Gran Canaria": (28.12, -15.43),
+    "Bilbao": (43.26, -2.93),
+    "Alicante": (38.35, -0.48),
+    "Córdoba": (37.88, -4.78),
+    "Valladolid": (41.65, -4.72),
+    "Vigo": (42.24, -8.72),
+    "Gijón": (43.54, -5.66),
+    "L'Hospitalet de Llobregat": (41.36, 2.10),
+    "A Coruña": (43.36, -8.41),
+    "Vitoria-Gasteiz": (42.85, -2.67),
+    "Granada": (37.18, -3.60),
+    "Elche": (38.27, -0.70),
+    "Oviedo": (43.36, -5.85),
+    "Badalona": (41.45, 2.25),
+    "Cartagena": (37.61, -0.99),
+    "Terrassa": (41.56, 2.01),
+    "Jerez de la Frontera": (36.69, -6.14),
+    "Sabadell": (41.55, 2.11),
+    "Santa Cruz de Tenerife": (28.46, -16.25),
+    "Móstoles": (40.32, -3.86),
+    "Alcalá de Henares": (40.48, -3.36),
+    "Fuenlabrada": (40.28, -3.79),
+    "Pamplona": (42.82, -1.64),
+    "Almería": (36.83, -2.46),
+    "Leganés": (40.33, -3.76),
+    "San Sebastián": (43.32, -1.98),
+    "Castellón de la Plana": (39.99, -0.05),
+    "Burgos": (42.34, -3.70),
+    "Santander": (43.46, -3.81),
+    "Albacete": (38.99, -1.86),
+    "Getafe": (40.31, -3.73),
+    "Alcorcón": (40.35, -3.82),
+    "Logroño": (42.47, -2.45),
+    "San Cristóbal de La Laguna": (28.49, -16.32),
+    "Badajoz": (38.88, -6.97),
+    "Salamanca": (40.97, -5.66),
+    "Huelva": (37.26, -6.94),
+    "Marbella": (36.51, -4.88),
+    "Lérida": (41.62, 0.62),
+    "Tarragona": (41.12, 1.25),
+    "León": (42.60, -5.57),
+    "Dos Hermanas": (37.28, -5.92),
+    "Parla": (40.24, -3.77),
+    "Mataró": (41.54, 2.44),
+    "Cádiz": (36.53, -6.29),
+    "Santa Coloma de Gramenet": (41.45, 2.21),
+    "Jaén": (37.77, -3.79),
+    "Igualada": (41.58, 1.62),
+    "Teruel": (40.34, -1.11),
+    "Algeciras": (36.13, -5.45),
+    "Reus": (41.16, 1.11),
+    "Ourense": (42.34, -7.86),
+    "Telde": (27.99, -15.42),
+    "Baracaldo": (43.30, -2.99),
+    "Málaga": (36.72, -4.42),
+    "Torrejón de Ardoz": (40.46, -3.48),
+    "Santiago de Compostela": (42.88, -8.54),
+    "Lugo": (43.01, -7.56),
+    "San Fernando": (36.46, -6.20),
+    "Avilés": (43.56, -5.92),
+    "Girona": (41.98, 2.82),
+    "Melilla": (35.29, -2.94),
+    "Toledo": (39.86, -4.03),
+    "Lorca": (37.68, -1.70),
+    "Ciudad Real": (38.99, -3.93),
+    "Guadalajara": (40.63, -3.17),
+    "Roquetas de Mar": (36.76, -2.61),
+    "Ceuta": (35.89, -5.32),
+    "Pontevedra": (42.43, -8.65),
+    "Rubí": (41.49, 2.03),
+    "Manresa": (41.73, 1.83),
+    "Ferrol": (43.48, -8.24),
+    "Cuenca": (40.07, -2.14),
+    "Benidorm": (38.54, -0.13),
+    "Pozuelo de Alarcón": (40.43, -3.81),
+    "Arrecife": (28.96, -13.55),
+    "Murcia": (37.99, -1.13),
+    "Chiclana de la Frontera": (36.42, -6.15),
+    "Zamora": (41.50, -5.75),
+    "Talavera de la Reina": (39.96, -4.83),
+    "Cáceres": (39.48, -6.37),
+    "Valdepeñas": (38.76, -3.38),
+    "Gavá": (41.31, 2.00),
+    "Soria": (41.76, -2.47),
+    "Blanes": (41.67, 2.79),
+    "Majadahonda": (40.47, -3.87),
+    "Orihuela": (38.08, -0.94),
+    "Coslada": (40.42, -3.56),
+    "Valdemoro": (40.19, -3.67),
+    "Mollet del Vallès": (41.54, 2.21),
+    "Sagunto": (39.68, -0.27),
+    "Collado Villalba": (40.63, -4.00),
+    "Aranjuez": (40.03, -3.60),
+    "Ávila": (40.66, -4.70),
+    "Torremolinos": (36.62, -4.50),
+    "Palencia": (42.01, -4.53),
+    "Elda": (38.48, -0.79),
+    "Granollers": (41.61, 2.29),
+    "Villareal": (39.94, -0.10),
+    "Motril": (36.75, -3.52),
+    "Ibiza": (38.91, 1.43),
+    "Puerto Real": (36.53, -6.19),
+    "Sanlúcar de Barrameda": (36.78, -6.35),
+    "Manacor": (39.57, 3.21),
+    "Huesca": (42.14, -0.41),
+    "Paterna": (39.50, -0.44),
+    "Inca": (39.72, 2.91),
+    "Segovia": (40.95, -4.12),
+    "Denia": (38.84, 0.11),
+    "Viladecans": (41.31, 2.01),
+    "Antequera": (37.02, -4.56),
+    "Alcoy": (38.70, -0.47),
+    "Rincón de la Victoria": (36.72, -4.28),
+    "Figueras": (42.27, 2.96),
+    "Cambrils": (41.07, 1.06),
+    "Aranda de Duero": (41.67, -3.69),
+    "Moncada y Reixach": (41.48, 2.19),
+    "Puertollano": (38.69, -4.11),
+    "Ronda": (36.74, -5.17),
+    "Cerdanyola del Vallès": (41.49, 2.14),
+    "Estepona": (36.43, -5.15),
+    "Gandía": (38.97, -0.18),
+    "Torrevieja": (37.98, -0.68),
+    "Irun": (43.34, -1.79),
+    "Vic": (41.93, 2.25),
+    "Benalmádena": (36.60, -4.52),
+    "Don Benito": (38.96, -5.86),
+    "Lucena": (37.41, -4.49),
+    "Villena": (38.63, -0.86),
+    "El Ejido": (36.78, -2.81),
+    "Utrera": (37.18, -5.78),
+    "Alcobendas": (40.55, -3.64),
+    "San Sebastián de los Reyes": (40.55, -3.63),
+}
+
+# Other spellings (regional names, old spellings) of gazetteer entries.
+# Spellings that only differ by accents, like "Sória", need no entry.
+ALIASES = {
+    "Eivissa": "Ibiza",
+    "Lleida": "Lérida",
+    "Gerona": "Girona",
+    "Donostia": "San Sebastián",
+    "Donostia-San Sebastián": "San Sebastián",
+    "Barakaldo": "Baracaldo",
+    "Figueres": "Figueras",
+    "Vila-real": "Villareal",
+    "Villarreal": "Villareal",
+    "Alcoi": "Alcoy",
+    "Gavà": "Gavá",
+    "Irún": "Irun",
+    "Montcada i Reixac": "Moncada y Reixach",
+    "Orense": "Ourense",
+    "La Coruña": "A Coruña",
+    "Vitoria": "Vitoria-Gasteiz",
+    "Castellón": "Castellón de la Plana",
+    "Castelló de la Plana": "Castellón de la Plana",
+    "Elx": "Elche",
+    "Alacant": "Alicante",
+    "Dénia": "Denia",
+    "Gandia": "Gandía",
+    "Sagunt": "Sagunto",
+    "Palma de Mallorca": "Palma",
+    "Seville": "Sevilla",
+}
+
+# Coordinates learned for cities typed under "Other", kept across restarts
+CACHE_PATH = os.environ.get(
+    "GEOCODE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "geocode_cache.json")
+)
+
+_lock = threading.Lock()
+_learned = None
+
+
+def normalize_name(name):
+    # Case, accent and whitespace insensitive key
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
+
+
+_INDEX = {normalize_name(city): coords for city, coords in GAZETTEER.items()}
+_INDEX.update({normalize_name(alias): GAZETTEER[city] for alias, city in ALIASES.items()})
+
+
+def _load_learned():
+    global _learned
+    if _learned is None:
+        try:
+            with open(CACHE_PATH, encoding="utf-8") as f:
+                _learned = {key: tuple(coords) for key, coords in json.load(f).items()}
+        except (OSError, ValueError):
+            _learned = {}
+    return _learned
+
+
+def lookup(city):
+    # (lat, lon) for a city, or None when it is neither bundled nor learned
+    key = normalize_name(city)
+    if key in _INDEX:
+        return _INDEX[key]
+    with _lock:
+        return _load_learned().get(key)
+
+
+def remember(city, lat, lon):
+    # Persists the coordinates an upstream call resolved for a typed city
+    key = normalize_name(city)
+    if not key or key in _INDEX:
+        return
+    with _lock:
+        learned = _load_learned()
+        coords = (round(lat, 4), round(lon, 4))
+        if learned.get(key) == coords:
+            return
+        learned[key] = coords
+        try:
+            os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+            tmp_path = CACHE_PATH + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(learned, f, ensure_ascii=False, sort_keys=True)
+            os.replace(tmp_path, CACHE_PATH)
+        except OSError:
+            pass
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeouts in seconds so a stalled upstream never pins a script thread
+TIMEOUT = (3.05, 10)
+# Wall-clock cap for one get(), retries and backoff included
+MAX_CALL_TIME = 15
+POOL_MAXSIZE = 16
+# Transient server errors are retried here with exponential backoff. 429 is
+# not: throttling is left to the token buckets and the stale-cache fallback,
+# so a Retry-After never holds a worker.
+RETRIES = 2
+BACKOFF = 0.5
+RETRY_STATUSES = frozenset([500, 502, 503, 504])
+# Number of recent latencies kept per host
+LATENCY_WINDOW = 500
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+_calls = defaultdict(int)
+_errors = defaultdict(int)
+_stats_lock = threading.Lock()
+
+
+def _session_for(host):
+    # One keep-alive session (and connection pool) per upstream host
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def _record(host, elapsed, failed):
+    with _stats_lock:
+        _latencies[host].append(elapsed)
+        _calls[host] += 1
+        if failed:
+            _errors[host] += 1
+
+
+def get(url, headers=None, timeout=TIMEOUT, max_time=MAX_CALL_TIME):
+    # Returns the Response, or None when the upstream could not be reached.
+    # Each attempt's timeouts are clipped to what is left of max_time.
+    host = urlsplit(url).netloc
+    session = _session_for(host)
+    start = time.perf_counter()
+    deadline = start + max_time
+    response = None
+    for attempt in range(RETRIES + 1):
+        remaining = deadline - time.perf_counter()
+        try:
+            response = session.get(url, headers=headers, timeout=tuple(min(t, remaining) for t in timeout))
+        except requests.RequestException:
+            response = None
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            break
+        delay = BACKOFF * 2 ** attempt
+        if attempt == RETRIES or time.perf_counter() + delay >= deadline:
+            break
+        time.sleep(delay)
+    _record(host, time.perf_counter() - start, response is None or response.status_code != 200)
+    return response
+
+
+def json_body(response):
+    # Decoded body of a successful response, otherwise None
+    if response is None or response.status_code != 200:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+def get_json(url, headers=None, timeout=TIMEOUT):
+    return json_body(get(url, headers=headers, timeout=timeout))
+
+
+def latency_stats():
+    with _stats_lock:
+        stats = {}
+        for host, samples in _latencies.items():
+            ordered = sorted(samples)
+            stats[host] = {
+                "calls": _calls[host],
+                "errors": _errors[host],
+                "avg": sum(ordered) / len(ordered),
+                "max": ordered[-1],
+            }
+        return stats
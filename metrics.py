@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Per-stage timings (upstream fetches, tab data preparation, figure renders)
+# for the debug panel and a Prometheus text export. Stage names are
+# "<kind>.<name>", e.g. "fetch.forecast", "prep.df_sources", "render.heating".
+STAGE_WINDOW = 1000
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "energy_app"
+# When set, the exposition is rewritten there periodically, e.g. for the
+# node_exporter textfile collector
+METRICS_PATH = os.environ.get("METRICS_PATH")
+EXPORT_INTERVAL = 15
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=STAGE_WINDOW))
+_totals = defaultdict(lambda: [0, 0.0, 0])  # count, sum, errors
+_exporter = None
+
+
+def record(stage, seconds, failed=False):
+    with _lock:
+        _samples[stage].append(seconds)
+        total = _totals[stage]
+        total[0] += 1
+        total[1] += seconds
+        if failed:
+            total[2] += 1
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        record(stage, time.perf_counter() - start, failed)
+
+
+def _quantile(ordered, q):
+    # Nearest-rank quantile of a sorted list
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def stage_stats():
+    with _lock:
+        snapshot = {stage: (sorted(samples), list(_totals[stage])) for stage, samples in _samples.items()}
+    stats = []
+    for stage, (ordered, (count, total, errors)) in sorted(snapshot.items()):
+        row = {"stage": stage, "count": count, "errors": errors, "mean": total / count}
+        for q in QUANTILES:
+            row[f"p{round(q * 100)}"] = _quantile(ordered, q)
+        stats.append(row)
+    return stats
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def prometheus_text():
+    # Prometheus text exposition format (version 0.0.4)
+    from cache import cache_stats
+    from http_client import latency_stats
+
+    lines = [
+        f"# HELP {PREFIX}_stage_seconds Duration of app stages; quantiles over the last {STAGE_WINDOW} runs.",
+        f"# TYPE {PREFIX}_stage_seconds summary",
+    ]
+    stats = stage_stats()
+    for row in stats:
+        for q in QUANTILES:
+            lines.append(f"{PREFIX}_stage_seconds{_labels(stage=row['stage'], quantile=q)} {row[f'p{round(q * 100)}']:.6f}")
+        lines.append(f"{PREFIX}_stage_seconds_sum{_labels(stage=row['stage'])} {row['mean'] * row['count']:.6f}")
+        lines.append(f"{PREFIX}_stage_seconds_count{_labels(stage=row['stage'])} {row['count']}")
+    lines += [f"# HELP {PREFIX}_stage_errors_total Stage runs that raised or got no upstream data.",
+              f"# TYPE {PREFIX}_stage_errors_total counter"]
+    lines += [f"{PREFIX}_stage_errors_total{_labels(stage=row['stage'])} {row['errors']}" for row in stats]
+
+    caches = cache_stats()
+    for metric, field, kind in (("cache_hits_total", "hits", "counter"), ("cache_misses_total", "misses", "counter"),
+                                ("cache_hit_ratio", "hit_ratio", "gauge"), ("cache_entries", "size", "gauge")):
+        lines.append(f"# TYPE {PREFIX}_{metric} {kind}")
+        lines += [f"{PREFIX}_{metric}{_labels(cache=cache['name'])} {cache[field]}" for cache in caches]
+
+    hosts = latency_stats()
+    for metric, field in (("upstream_requests_total", "calls"), ("upstream_errors_total", "errors")):
+        lines.append(f"# TYPE {PREFIX}_{metric} counter")
+        lines += [f"{PREFIX}_{metric}{_labels(host=host)} {host_stats[field]}" for host, host_stats in hosts.items()]
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=None):
+    # Atomic rewrite so a scraper never reads a half-written file
+    path = path or METRICS_PATH
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+
+def _export_loop():
+    while True:
+        try:
+            write_textfile()
+        except OSError:
+            pass
+        time.sleep(EXPORT_INTERVAL)
+
+
+def start_export():
+    # Idempotent; does nothing unless METRICS_PATH is set
+    global _exporter
+    with _lock:
+        if _exporter is not None or not METRICS_PATH:
+            return
+        _exporter = threading.Thread(target=_export_loop, name="metrics-export", daemon=True)
+        _exporter.start()
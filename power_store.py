@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from api import get_power_breakdown_history
+
+# Local store of ElectricityMap power consumption breakdowns, one row per
+# (zone, hour, source). Each refresh rewrites the ~24 hours it fetched, so
+# ElectricityMap's revisions of recent hours replace what was stored, and
+# long ranges cost one small fetch plus a local range query.
+STORE_PATH = os.environ.get(
+    "POWER_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "power_history.sqlite3")
+)
+RETENTION_DAYS = 90
+HOUR_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS power_breakdown (
+    zone TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    source TEXT NOT NULL,
+    power_mw REAL,
+    PRIMARY KEY (zone, hour, source)
+) WITHOUT ROWID
+"""
+
+_write_lock = threading.Lock()
+_initialized = set()
+
+
+@contextmanager
+def _connect(path=None):
+    # Short-lived connection per call: commits on success, always closed
+    path = path or STORE_PATH
+    if path not in _initialized:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        with conn:
+            if path not in _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(SCHEMA)
+                _initialized.add(path)
+            yield conn
+    finally:
+        conn.close()
+
+
+def latest_hour(zone, path=None):
+    with _connect(path) as conn:
+        row = conn.execute("SELECT MAX(hour) FROM power_breakdown WHERE zone = ?", (zone,)).fetchone()
+    return row[0]
+
+
+def ingest(zone, power_history, path=None):
+    # Upserts every hour of a records.PowerHistory: the stored rows of those
+    # hours are replaced, so revised values (and sources no longer reported)
+    # are updated. Returns the number of hours written.
+    import numpy as np
+
+    if not power_history or not len(power_history.hours):
+        return 0
+    hours = np.char.add(np.datetime_as_string(power_history.hours, unit="s"), "Z")
+    rows = [
+        (zone, hour, source, float(value))
+        for hour, values in zip(hours, power_history.power)
+        for source, value in zip(power_history.sources, values)
+        if not np.isnan(value)
+    ]
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)).strftime(HOUR_FORMAT)
+    with _write_lock, _connect(path) as conn:
+        conn.executemany(
+            "DELETE FROM power_breakdown WHERE zone = ? AND hour = ?", [(zone, str(hour)) for hour in hours]
+        )
+        conn.executemany("INSERT OR REPLACE INTO power_breakdown VALUES (?, ?, ?, ?)", rows)
+        conn.execute("DELETE FROM power_breakdown WHERE zone = ? AND hour < ?", (zone, cutoff))
+    return len(hours)
+
+
+def refresh(zone, path=None):
+    return ingest(zone, get_power_breakdown_history(zone), path)
+
+
+def _utc_text(value):
+    import pandas as pd
+
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.strftime(HOUR_FORMAT)
+
+
+def query(zone, start=None, end=None, path=None):
+    # Hourly frame for [start, end): DatetimeIndex (UTC), one column per source
+    import pandas as pd
+
+    sql = "SELECT hour, source, power_mw FROM power_breakdown WHERE zone = ?"
+    params = [zone]
+    if start is not None:
+        sql += " AND hour >= ?"
+        params.append(_utc_text(start))
+    if end is not None:
+        sql += " AND hour < ?"
+        params.append(_utc_text(end))
+    with _connect(path) as conn:
+        long = pd.read_sql_query(sql, conn, params=params)
+    if long.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], tz="UTC", name="datetime"))
+    frame = long.pivot(index="hour", columns="source", values="power_mw")
+    frame.index = pd.to_datetime(frame.index, utc=True)
+    frame.index.name = "datetime"
+    frame.columns.name = None
+    return frame.sort_index()
+
+
+def query_last(zone, days, path=None):
+    now = datetime.now(timezone.utc)
+    return query(zone, start=now - timedelta(days=days), end=now + timedelta(hours=1), path=path)
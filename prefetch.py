@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import best_time
+import geocode
+from api import (
+    get_air_pollution,
+    get_carbon_intensity,
+    get_current_weather,
+    get_power_breakdown_history,
+    get_solar_radiation,
+    get_weather_forecast,
+)
+from cache import city_key, zone_key
+from ratelimit import TokenBucket
+
+# Background refresh of the most requested cities and zones, so their cache
+# entries are reloaded shortly before they expire instead of on a user's
+# request. Started once per server process by the app.
+log = logging.getLogger("prefetch")
+
+PREFETCH_TOP_N = int(os.environ.get("PREFETCH_TOP_N", 10))
+PREFETCH_TOP_ZONES = 3
+PREFETCH_INTERVAL = 30
+# Entries expiring within this many seconds are reloaded on the current pass
+PREFETCH_LEAD = 3 * PREFETCH_INTERVAL
+PREFETCH_WORKERS = 4
+# Request counts halve every hour, so popularity follows recent use
+DEMAND_HALF_LIFE = 60 * 60
+# Share of each provider bucket kept free for interactive requests
+PROVIDER_RESERVE = 0.5
+# Global cap on upstream calls made by the scheduler, across all providers
+BUDGET = TokenBucket("prefetch", rate=600 / 3600, capacity=60)
+
+CITY_FETCHERS = (get_current_weather, get_weather_forecast)
+COORD_FETCHERS = (get_air_pollution, get_solar_radiation)
+ZONE_FETCHERS = (get_carbon_intensity, get_power_breakdown_history)
+
+_lock = threading.Lock()
+_city_demand = defaultdict(float)
+_zone_demand = defaultdict(float)
+_city_names = {}
+# Zone each city was last analysed with, for its best-time table
+_city_zones = {}
+_decayed_at = time.monotonic()
+_thread = None
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_stats = {"passes": 0, "reloaded": 0, "over_budget": 0, "errors": 0, "tables": 0}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _decay():
+    global _decayed_at
+    now = time.monotonic()
+    factor = 0.5 ** ((now - _decayed_at) / DEMAND_HALF_LIFE)
+    _decayed_at = now
+    for demand in (_city_demand, _zone_demand):
+        for name in list(demand):
+            demand[name] *= factor
+            if demand[name] < 0.01:
+                del demand[name]
+
+
+def record(city, zone):
+    # Counts one user request for a city and zone
+    key, zone = city_key(city)[0], zone_key(zone)[0]
+    if not key or not zone:
+        return
+    with _lock:
+        _city_demand[key] += 1
+        _zone_demand[zone] += 1
+        _city_names[key] = city
+        _city_zones[key] = zone
+
+
+def top(n=PREFETCH_TOP_N, zones=PREFETCH_TOP_ZONES):
+    # ([(city, demand)], [(zone, demand)]) in priority order
+    with _lock:
+        _decay()
+        for key in list(_city_names):
+            if key not in _city_demand:
+                del _city_names[key]
+                _city_zones.pop(key, None)
+        cities = sorted(_city_demand.items(), key=lambda item: -item[1])[:n]
+        top_zones = sorted(_zone_demand.items(), key=lambda item: -item[1])[:zones]
+    return [(_city_names[key], demand) for key, demand in cities], top_zones
+
+
+def _acquire(limiter):
+    def acquire():
+        # Global budget first, then a provider token only if it leaves the reserve
+        if not BUDGET.try_acquire():
+            _count("over_budget")
+            return False
+        if limiter is not None and not limiter.try_acquire_spare(limiter.capacity * PROVIDER_RESERVE):
+            _count("over_budget")
+            return False
+        return True
+    return acquire
+
+
+def _jobs():
+    # (fetcher, args) in priority order: most requested first
+    cities, zones = top()
+    jobs = []
+    for city, _ in cities:
+        jobs.extend((fetcher, (city,)) for fetcher in CITY_FETCHERS)
+        coords = geocode.lookup(city)
+        if coords:
+            jobs.extend((fetcher, coords) for fetcher in COORD_FETCHERS)
+    for zone, _ in zones:
+        jobs.extend((fetcher, (zone,)) for fetcher in ZONE_FETCHERS)
+    return jobs
+
+
+def _run(fetcher, args):
+    try:
+        if fetcher.prefetch(*args, lead=PREFETCH_LEAD, acquire=_acquire(fetcher.limiter)):
+            _count("reloaded")
+    except Exception:
+        _count("errors")
+        log.exception("prefetch of %s%r failed", fetcher.__name__, args)
+
+
+def _refresh_tables():
+    # Rebuilds the best-time tables of the top cities from the freshly
+    # prefetched cache entries; no upstream calls. Each zone's history is
+    # stored and profiled once, however many cities share it.
+    cities, _ = top()
+    with _lock:
+        zones = {city: _city_zones.get(city_key(city)[0]) for city, _ in cities}
+    profiles = {}
+    for city, zone in zones.items():
+        if not zone:
+            continue
+        try:
+            if zone not in profiles:
+                profiles[zone] = best_time.zone_profile(zone)
+            if best_time.refresh_cached(city, zone, profiles[zone]) is not None:
+                _count("tables")
+        except Exception:
+            _count("errors")
+            log.exception("best-time table for %s failed", city)
+
+
+def run_once():
+    futures = [_executor.submit(_run, fetcher, args) for fetcher, args in _jobs()]
+    wait(futures)
+    _refresh_tables()
+    _count("passes")
+
+
+def _loop():
+    while True:
+        started = time.monotonic()
+        try:
+            run_once()
+        except Exception:
+            log.exception("prefetch pass failed")
+        time.sleep(max(0.0, PREFETCH_INTERVAL - (time.monotonic() - started)))
+
+
+def start():
+    # Idempotent: one scheduler thread per process, none when PREFETCH_TOP_N is 0
+    global _thread
+    with _lock:
+        if _thread is not None or PREFETCH_TOP_N <= 0:
+            return
+        _thread = threading.Thread(target=_loop, name="prefetch-scheduler", daemon=True)
+        _thread.start()
+
+
+def stats():
+    cities, zones = top()
+    with _lock:
+        counts = dict(_stats)
+    return dict(counts, cities=cities, zones=zones, budget=BUDGET.stats())
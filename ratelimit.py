@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+class TokenBucket:
+    # Refills `rate` tokens per second up to `capacity`; one token per upstream call.
+    # Interactive use never waits (max_wait=0); batch jobs can raise max_wait
+    # to queue behind the quota instead of being refused.
+    def __init__(self, name, rate, capacity, max_wait=0):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.rejected = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire_spare(self, reserve):
+        # Takes a token only if at least `reserve` stay available, so
+        # background work never eats into what interactive users need
+        with self._lock:
+            self._refill()
+            if self._tokens >= reserve + 1:
+                self._tokens -= 1
+                self.granted += 1
+                return True
+            return False
+
+    def try_acquire(self):
+        return self.acquire(self.max_wait)
+
+    def acquire(self, timeout, reserve=0):
+        # Waits up to `timeout` seconds for a token (leaving `reserve` free),
+        # sleeping until the next refill; a failed wait counts one rejection
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire_spare(reserve):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                with self._lock:
+                    self.rejected += 1
+                return False
+            time.sleep(min(max(self.wait_time(reserve), 0.01), remaining))
+        return True
+
+    def wait_time(self, reserve=0):
+        # Seconds until a token is available beyond `reserve`
+        with self._lock:
+            self._refill()
+            return max(0.0, (reserve + 1 - self._tokens) / self.rate)
+
+    def stats(self):
+        with self._lock:
+            self._refill()
+            return {
+                "name": self.name,
+                "tokens": self._tokens,
+                "capacity": self.capacity,
+                "granted": self.granted,
+                "rejected": self.rejected,
+            }
+
+
+# Buckets sized to each provider's free-tier quota
+OPENWEATHER = TokenBucket("openweather", rate=60 / 60, capacity=60)
+ELECTRICITYMAP = TokenBucket("electricitymap", rate=100 / 3600, capacity=20)
+OPEN_METEO = TokenBucket("open-meteo", rate=10_000 / 86_400, capacity=600)
+
+LIMITERS = {bucket.name: bucket for bucket in (OPENWEATHER, ELECTRICITYMAP, OPEN_METEO)}
@@ -0,0 +1,184 @@
+# Compact records parsed from the API payloads at fetch time.
+#
+# Only the fields the app reads are kept: small slotted dataclasses for the
+# scalar payloads and NumPy arrays for the hourly ones. Parsing validates the
+# payload once, so the rest of the app can rely on the fields being present.
+# Every record carries stale_since, set on the copy the cache serves past
+# its TTL. numpy is imported on first use.
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+# Pollutants in the order OpenWeather lists them
+POLLUTANTS = ("co", "no", "no2", "o3", "so2", "pm2_5", "pm10", "nh3")
+
+
+class InvalidPayload(ValueError):
+    pass
+
+
+def _number(value, name, optional=False):
+    if value is None and optional:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise InvalidPayload(f"{name}: expected a number, got {value!r}")
+    return float(value)
+
+
+@dataclass(frozen=True, slots=True)
+class CurrentWeather:
+    city: str
+    lat: float
+    lon: float
+    temp: float
+    feels_like: float
+    humidity: float
+    description: str
+    icon: str
+    wind_speed: float
+    wind_deg: float
+    wind_gust: float | None
+    stale_since: float | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class AirQuality:
+    aqi: int
+    co: float
+    no: float
+    no2: float
+    o3: float
+    so2: float
+    pm2_5: float
+    pm10: float
+    nh3: float
+    stale_since: float | None = None
+
+    def components(self):
+        return {name: getattr(self, name) for name in POLLUTANTS}
+
+
+@dataclass(frozen=True, slots=True)
+class CarbonIntensity:
+    zone: str
+    intensity: float | None
+    stale_since: float | None = None
+
+
+# Hourly series: eq=False since NumPy arrays do not compare to a single bool
+@dataclass(frozen=True, slots=True, eq=False)
+class Forecast:
+    # Structured array with forecast.FORECAST_DTYPE, one row per 3-hour slot
+    slots: object
+    stale_since: float | None = None
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class SolarRadiation:
+    # Local wall-clock hours (datetime64[m]) and W/m² per hour
+    times: object
+    shortwave: object
+    stale_since: float | None = None
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class PowerHistory:
+    # hours: UTC datetime64[s]; power: MW as float32 (hours x sources), NaN
+    # where a source is not reported; renewable_pct: float32 per hour
+    zone: str
+    hours: object
+    sources: tuple
+    power: object
+    renewable_pct: object
+    stale_since: float | None = None
+
+    def latest_renewable_pct(self):
+        import numpy as np
+
+        if not len(self.renewable_pct) or np.isnan(self.renewable_pct[-1]):
+            return None
+        return float(self.renewable_pct[-1])
+
+
+def parse_current_weather(payload):
+    weather = payload['weather'][0]
+    wind = payload.get('wind') or {}
+    return CurrentWeather(
+        city=str(payload.get('name', "")),
+        lat=_number(payload['coord']['lat'], "coord.lat"),
+        lon=_number(payload['coord']['lon'], "coord.lon"),
+        temp=_number(payload['main']['temp'], "main.temp"),
+        feels_like=_number(payload['main']['feels_like'], "main.feels_like"),
+        humidity=_number(payload['main'].get('humidity'), "main.humidity", optional=True),
+        description=str(weather['description']),
+        icon=str(weather['icon']),
+        wind_speed=_number(wind.get('speed', 0), "wind.speed"),
+        wind_deg=_number(wind.get('deg', 0), "wind.deg"),
+        wind_gust=_number(wind.get('gust'), "wind.gust", optional=True),
+    )
+
+
+def parse_air_quality(payload):
+    entry = payload['list'][0]
+    components = entry['components']
+    aqi = entry['main']['aqi']
+    if aqi not in (1, 2, 3, 4, 5):
+        raise InvalidPayload(f"main.aqi: expected 1-5, got {aqi!r}")
+    return AirQuality(aqi=aqi, **{name: _number(components.get(name, 0), name) for name in POLLUTANTS})
+
+
+def parse_carbon_intensity(payload, zone):
+    # /carbon-intensity/latest answers {"carbonIntensity": 123, ...}; older
+    # responses nested it one level deeper
+    intensity = payload.get("carbonIntensity") if isinstance(payload, dict) else payload
+    if isinstance(intensity, dict):
+        intensity = intensity.get("carbonIntensity")
+    return CarbonIntensity(zone=zone, intensity=_number(intensity, "carbonIntensity", optional=True))
+
+
+def parse_forecast(payload):
+    from forecast import forecast_slots
+
+    slots = forecast_slots(payload)
+    if not len(slots):
+        raise InvalidPayload("list: no forecast slots")
+    return Forecast(slots=slots)
+
+
+def parse_solar_radiation(payload):
+    import numpy as np
+
+    hourly = payload['hourly']
+    times = np.array(hourly['time'], dtype="datetime64[m]")
+    shortwave = np.array([np.nan if v is None else v for v in hourly['shortwave_radiation']], dtype="float32")
+    if times.shape != shortwave.shape:
+        raise InvalidPayload("hourly: time and shortwave_radiation lengths differ")
+    return SolarRadiation(times=times, shortwave=shortwave)
+
+
+def _utc_seconds(value):
+    # ElectricityMap timestamps ("2024-05-01T13:00:00.000Z") as naive UTC
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_power_history(payload, zone):
+    import numpy as np
+
+    history = payload['history']
+    sources = {}
+    for entry in history:
+        for source in entry.get('powerConsumptionBreakdown') or {}:
+            sources.setdefault(source, len(sources))
+    power = np.full((len(history), len(sources)), np.nan, dtype="float32")
+    renewable = np.full(len(history), np.nan, dtype="float32")
+    hours = np.empty(len(history), dtype="datetime64[s]")
+    for i, entry in enumerate(history):
+        hours[i] = _utc_seconds(entry['datetime'])
+        for source, value in (entry.get('powerConsumptionBreakdown') or {}).items():
+            if value is not None:
+                power[i, sources[source]] = _number(value, f"history[{i}].{source}")
+        if entry.get('renewablePercentage') is not None:
+            renewable[i] = _number(entry['renewablePercentage'], f"history[{i}].renewablePercentage")
+    return PowerHistory(zone=zone, hours=hours, sources=tuple(sources), power=power, renewable_pct=renewable)
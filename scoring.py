@@ -0,0 +1,107 @@
+# Energy estimates and efficiency scores.
+#
+# The *_all / *_array / *_frame variants apply the formulas to NumPy arrays
+# or DataFrames in one pass (every forecast slot, every city, every heating
+# type at once) and give the same results as the scalar formulas, rounding
+# included. numpy and pandas are imported on first use so importing this
+# module stays cheap.
+
+HEATING_TYPES = ["Electric", "Gas", "Heat pump"]
+# kWh per degree below COMFORT_TEMP for each heating type
+HEATING_FACTORS = {"Electric": 0.8, "Gas": 0.5, "Heat pump": 0.3}
+COMFORT_TEMP = 25
+# Shortwave radiation (W/m²) that counts as full sun in the hourly score
+PEAK_SHORTWAVE = 800
+
+
+# Scores
+def estimate_energy_use(temp, heating):
+    if heating == "Electric":
+        return max(0, 25 - temp) * 0.8
+    elif heating == "Gas":
+        return max(0, 25 - temp) * 0.5
+    else:
+        return max(0, 25 - temp) * 0.3
+
+def score_energy_consumption_day(carbon_intensity, aqi, temp):
+    carbon_score = max(0, 10 - (carbon_intensity / 100))
+    aqi_score = max(2, 12 - aqi * 2)
+    temp_diff = abs(temp - 20)
+    temp_score = max(0, 10 - (temp_diff / 4))
+    final_score = (carbon_score * 0.5) + (aqi_score * 0.2) + (temp_score * 0.3)
+    return round(final_score, 1)
+
+
+# Vectorized versions
+def heating_factor(heating):
+    # Like estimate_energy_use, any unknown heating type uses the heat pump factor
+    return HEATING_FACTORS.get(heating, HEATING_FACTORS["Heat pump"])
+
+def round_scores(scores, digits=1):
+    # Built-in round() per value: np.round scales by 10**digits first and
+    # breaks some .x5 ties the other way than the scalar formulas
+    import numpy as np
+
+    scores = np.asarray(scores, dtype=float)
+    return np.array([round(v, digits) for v in scores.ravel().tolist()], dtype=float).reshape(scores.shape)
+
+def estimate_energy_use_array(temps, heating):
+    import numpy as np
+
+    return np.maximum(0, COMFORT_TEMP - np.asarray(temps, dtype=float)) * heating_factor(heating)
+
+def estimate_energy_use_all(temps):
+    # Shape temps.shape + (len(HEATING_TYPES),), columns in HEATING_TYPES order
+    import numpy as np
+
+    factors = np.array([HEATING_FACTORS[h] for h in HEATING_TYPES])
+    deficit = np.maximum(0, COMFORT_TEMP - np.asarray(temps, dtype=float))
+    return deficit[..., np.newaxis] * factors
+
+def energy_use_frame(temps, index=None):
+    import pandas as pd
+
+    if index is None and isinstance(temps, pd.Series):
+        index = temps.index
+    return pd.DataFrame(estimate_energy_use_all(temps), columns=HEATING_TYPES, index=index)
+
+def score_energy_consumption_array(carbon_intensity, aqi, temp):
+    # Inputs broadcast against each other, e.g. one zone-wide carbon value
+    # against a vector of per-slot temperatures
+    import numpy as np
+
+    carbon_intensity = np.asarray(carbon_intensity, dtype=float)
+    aqi = np.asarray(aqi, dtype=float)
+    temp = np.asarray(temp, dtype=float)
+    carbon_score = np.maximum(0, 10 - (carbon_intensity / 100))
+    aqi_score = np.maximum(2, 12 - aqi * 2)
+    temp_score = np.maximum(0, 10 - (np.abs(temp - 20) / 4))
+    final_score = (carbon_score * 0.5) + (aqi_score * 0.2) + (temp_score * 0.3)
+    return round_scores(final_score)
+
+def energy_column(heating):
+    return "energy_" + heating.lower().replace(" ", "_")
+
+def score_frame(df, carbon_col="carbon_intensity", aqi_col="aqi", temp_col="temp"):
+    # Adds the efficiency score and one energy estimate column per heating type
+    scored = df.copy()
+    scored["score"] = score_energy_consumption_array(df[carbon_col], df[aqi_col], df[temp_col])
+    energy = estimate_energy_use_all(df[temp_col])
+    for i, heating in enumerate(HEATING_TYPES):
+        scored[energy_column(heating)] = energy[:, i]
+    return scored
+
+def score_hours_array(carbon_intensity, shortwave, temp):
+    # Hourly "good time to use energy" score on the same 0-10 scale: low
+    # grid carbon intensity, sunshine for solar self-consumption and mild
+    # temperatures. AQI is left out since only the current value is known.
+    import numpy as np
+
+    carbon_intensity = np.asarray(carbon_intensity, dtype=float)
+    shortwave = np.asarray(shortwave, dtype=float)
+    temp = np.asarray(temp, dtype=float)
+    carbon_score = np.maximum(0, 10 - (carbon_intensity / 100))
+    solar_score = 10 * np.clip(shortwave / PEAK_SHORTWAVE, 0, 1)
+    temp_score = np.maximum(0, 10 - (np.abs(temp - 20) / 4))
+    final_score = (carbon_score * 0.5) + (solar_score * 0.2) + (temp_score * 0.3)
+    return round_scores(final_score)
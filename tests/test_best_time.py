@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import best_time
+import prefetch
+from cache import TTLCache
+from forecast import FORECAST_DTYPE
+from records import CarbonIntensity, Forecast
+
+NOW = pd.Timestamp("2026-03-02 10:00", tz="UTC")
+
+
+def table(scores, start=NOW - pd.Timedelta(hours=6)):
+    index = pd.date_range(start, periods=len(scores), freq="h", tz="UTC")
+    return pd.DataFrame({"score": np.asarray(scores, dtype=float)}, index=index)
+
+
+def test_best_window_bounds():
+    scores = [5.0] * 60
+    scores[6 + 20:6 + 23] = [9.0, 9.5, 9.0]
+    start, end, score = best_time.best_window(table(scores), hours=3, days=1, now=NOW)
+    assert start == NOW + pd.Timedelta(hours=20)
+    assert end == start + pd.Timedelta(hours=3)
+    assert score == pytest.approx((9.0 + 9.5 + 9.0) / 3)
+
+
+def test_best_window_stays_within_the_days_asked():
+    scores = [5.0] * 60
+    scores[6 + 30:6 + 33] = [10.0] * 3
+    for hours in range(1, 7):
+        start, end, _ = best_time.best_window(table(scores), hours=hours, days=1, now=NOW)
+        assert NOW <= start and end <= NOW + pd.Timedelta(days=1)
+        assert end - start == pd.Timedelta(hours=hours)
+
+
+def test_best_window_skips_past_hours():
+    scores = [10.0] * 6 + list(np.linspace(2, 6, 30))
+    start, end, _ = best_time.best_window(table(scores), hours=2, days=1, now=NOW)
+    assert start >= NOW
+    assert end == NOW + pd.Timedelta(days=1)
+    assert (best_time.upcoming_scores(table(scores), 1, NOW).index >= NOW).all()
+
+
+def test_best_window_needs_enough_upcoming_hours():
+    assert best_time.best_window(table([9.0] * 8), hours=3, days=1, now=NOW) is None
+    assert best_time.best_window(None) is None
+
+
+def forecast(temps):
+    start = int(NOW.timestamp())
+    rows = [(start + i * 3 * 3600, temp, temp, 50, 3, 180, 20) for i, temp in enumerate(temps)]
+    return Forecast(np.array(rows, dtype=FORECAST_DTYPE))
+
+
+def test_refresh_index_recomputes_only_changed_inputs(monkeypatch):
+    monkeypatch.setattr(best_time, "_tables", TTLCache("best_time_test", ttl=60))
+    profile = pd.DataFrame({"carbon": np.linspace(100, 330, 24), "renewable_pct": np.linspace(80, 20, 24)})
+    temps = forecast([4.0, 7.0, 10.0, 13.0, 10.0])
+
+    first = best_time.refresh_index("Madrid", "ES", temps, None, None, profile)
+    assert first.index[0] == NOW and len(first) == 13
+    assert first["shortwave"].eq(0).all()
+    assert first["carbon"].tolist() == profile["carbon"].iloc[first.index.hour].tolist()
+    assert best_time.refresh_index("Madrid", "ES", temps, None, None, profile) is first
+
+    doubled = best_time.refresh_index("Madrid", "ES", temps, None, CarbonIntensity("ES", 1e6), profile)
+    assert doubled["temp"].tolist() == first["temp"].tolist()
+    assert (doubled["carbon"] > first["carbon"]).all()
+    assert (doubled["score"] <= first["score"]).all()
+
+
+def test_refresh_tables_profiles_each_zone_once(monkeypatch):
+    history = object()
+    ingested, profiled, built = [], [], []
+    monkeypatch.setattr(best_time, "_ingested", {})
+    monkeypatch.setattr(best_time.get_power_breakdown_history, "peek", lambda zone: history)
+    monkeypatch.setattr(best_time.power_store, "ingest", lambda zone, power_history: ingested.append(zone))
+    monkeypatch.setattr(best_time, "grid_profile", lambda zone: profiled.append(zone) or f"profile {zone}")
+    monkeypatch.setattr(best_time, "refresh_cached", lambda city, zone, profile: built.append((city, profile)))
+    monkeypatch.setattr(prefetch, "top", lambda: ([("Madrid", 3), ("Sevilla", 2), ("Lisboa", 1)], []))
+    monkeypatch.setattr(prefetch, "_city_zones", {"madrid": "ES", "sevilla": "ES", "lisboa": "PT"})
+
+    prefetch._refresh_tables()
+    assert ingested == ["ES", "PT"]
+    assert profiled == ["ES", "PT"]
+    assert built == [("Madrid", "profile ES"), ("Sevilla", "profile ES"), ("Lisboa", "profile PT")]
+
+    # The next pass finds the same cached history and does not store it again
+    prefetch._refresh_tables()
+    assert ingested == ["ES", "PT"]
@@ -0,0 +1,184 @@
+import threading
+import time
+
+import pytest
+
+import cache
+from cache import STALE_FLAG, SingleFlight, TTLCache, cached, is_stale, stale_since
+from ratelimit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        time.sleep(0)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def test_ttl_cache_expires_entries(clock):
+    ttl_cache = TTLCache("t_expire", ttl=10, max_stale=0)
+    ttl_cache.set(("a",), 1)
+    assert ttl_cache.get(("a",)) == (True, 1)
+    clock.advance(11)
+    assert ttl_cache.get(("a",)) == (False, None)
+    assert ttl_cache.stats()["hits"] == 1
+    assert ttl_cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    ttl_cache = TTLCache("t_lru", ttl=10, maxsize=2)
+    ttl_cache.set(("a",), 1)
+    ttl_cache.set(("b",), 2)
+    ttl_cache.get(("a",))
+    ttl_cache.set(("c",), 3)
+    assert ttl_cache.get(("b",)) == (False, None)
+    assert ttl_cache.get(("a",)) == (True, 1)
+    assert ttl_cache.stats()["evictions"] == 1
+
+
+def test_stale_copies_are_kept_until_max_stale(clock):
+    ttl_cache = TTLCache("t_stale", ttl=10, max_stale=20)
+    ttl_cache.set(("a",), {"temp": 20})
+    fetched_at = clock.now
+    clock.advance(15)
+    assert ttl_cache.get(("a",)) == (False, None)
+    stale = ttl_cache.get_stale(("a",))
+    assert stale == {"temp": 20, STALE_FLAG: fetched_at}
+    assert is_stale(stale) and stale_since(stale) == fetched_at
+    assert ttl_cache.peek(("a",)) == {"temp": 20}
+    clock.advance(20)
+    assert ttl_cache.get_stale(("a",)) is None
+
+
+def test_peek_does_not_count_lookups(clock):
+    ttl_cache = TTLCache("t_peek", ttl=10)
+    ttl_cache.set(("a",), 1)
+    assert ttl_cache.peek(("a",)) == 1
+    assert ttl_cache.peek(("b",)) is None
+    assert ttl_cache.stats()["hits"] == ttl_cache.stats()["misses"] == 0
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.coalesced == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ["value"] * 5
+
+
+def test_single_flight_shares_exceptions():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("k", fail)
+    # Nothing is left in flight after a failure
+    assert flight.do("k", lambda: 1) == 1
+
+
+def test_cached_normalizes_keys_and_skips_failures(clock):
+    calls = []
+
+    @cached("t_cached", ttl=10, key=cache.city_key)
+    def fetch(city):
+        calls.append(city)
+        return None if city == "nowhere" else {"city": city}
+
+    assert fetch("  Madrid ") == {"city": "madrid"}
+    assert fetch("MADRID") == {"city": "madrid"}
+    assert fetch("nowhere") is None
+    assert fetch("nowhere") is None
+    assert calls == ["madrid", "nowhere", "nowhere"]
+
+
+def test_cached_serves_stale_and_refreshes_in_background(clock):
+    answers = iter([{"temp": 1}, None, {"temp": 2}])
+
+    @cached("t_refresh", ttl=10, key=cache.city_key)
+    def fetch(city):
+        return next(answers)
+
+    assert fetch("Madrid") == {"temp": 1}
+    fetched_at = clock.now
+    clock.advance(11)
+    stale = fetch("Madrid")
+    assert stale == {"temp": 1, STALE_FLAG: fetched_at}
+    wait_for(lambda: fetch.peek("Madrid") == {"temp": 2})
+    assert fetch("Madrid") == {"temp": 2}
+    assert fetch.cache.stats()["stale_served"] == 1
+
+
+def test_cached_serves_stale_when_over_budget(clock):
+    bucket = TokenBucket("t_bucket", rate=1e-9, capacity=1)
+    calls = []
+
+    @cached("t_budget", ttl=10, key=cache.city_key, limiter=bucket)
+    def fetch(city):
+        calls.append(city)
+        return {"calls": len(calls)}
+
+    assert fetch("Madrid") == {"calls": 1}
+    clock.advance(11)
+    assert stale_since(fetch("Madrid")) is not None
+    assert fetch("Sevilla") is None
+    assert calls == ["madrid"]
+
+
+def test_token_bucket_waits_for_refill_and_counts_one_rejection():
+    bucket = TokenBucket("t_wait", rate=50, capacity=1)
+    assert bucket.try_acquire()
+    assert bucket.acquire(1.0)
+    assert not bucket.acquire(0)
+    assert bucket.stats()["rejected"] == 1
+    assert bucket.stats()["granted"] == 2
+
+
+def test_token_bucket_keeps_reserve():
+    bucket = TokenBucket("t_reserve", rate=1e-9, capacity=3)
+    assert bucket.try_acquire_spare(2)
+    assert not bucket.try_acquire_spare(2)
+    assert bucket.try_acquire()
@@ -0,0 +1,49 @@
+import pytest
+
+import city_index
+from city_index import resolve
+
+
+@pytest.fixture(autouse=True)
+def no_unknown_cities(monkeypatch):
+    monkeypatch.setattr(city_index, "_unknown", {})
+
+
+def test_known_cities_and_aliases_resolve_exactly():
+    assert resolve("  madrid ") == ("Madrid", [])
+    assert resolve("Leon") == ("León", [])
+
+
+@pytest.mark.parametrize("typed", ["Sevilla la Nueva", "Palma del Río", "Valencia de Don Juan"])
+def test_names_with_extra_words_are_kept_without_corrections(typed):
+    assert resolve(typed) == (typed, [])
+
+
+def test_real_town_close_to_a_bundled_city_stays_as_typed():
+    # Ceutí (Murcia) is one letter away from Ceuta
+    city, suggestions = resolve("Ceuti")
+    assert city == "Ceuti"
+    assert suggestions == ["Ceuta"]
+
+
+@pytest.mark.parametrize("typed, correction", [("Madird", "Madrid"), ("Barcelna", "Barcelona"), ("Bilbo", "Bilbao")])
+def test_typos_are_offered_their_correction(typed, correction):
+    city, suggestions = resolve(typed)
+    assert city == typed
+    assert suggestions[0] == correction
+
+
+def test_unrelated_names_get_no_suggestions():
+    assert resolve("Xyzzyville") == ("Xyzzyville", [])
+    assert resolve("Getxo") == ("Getxo", [])
+
+
+def test_names_reported_unknown_upstream_are_rejected():
+    city_index.mark_unknown("Madird")
+    city, suggestions = resolve("Madird")
+    assert city is None
+    assert suggestions[0] == "Madrid"
+
+
+def test_empty_input():
+    assert resolve("   ") == (None, [])
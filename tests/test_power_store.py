@@ -0,0 +1,20 @@
+import numpy as np
+
+import power_store
+from records import PowerHistory
+
+
+def history(power):
+    now = np.datetime64("now", "h")
+    hours = np.array([now - np.timedelta64(i, "h") for i in range(len(power) - 1, -1, -1)], dtype="datetime64[s]")
+    return PowerHistory("ES", hours, ("gas", "wind"), np.array(power, dtype="float32"), np.zeros(len(power), "float32"))
+
+
+def test_ingest_applies_revisions_of_stored_hours(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    assert power_store.ingest("ES", history([[1, 2], [3, 4], [5, 6]]), path) == 3
+    assert power_store.ingest("ES", history([[1, 2], [30, np.nan], [5, 60]]), path) == 3
+    stored = power_store.query_last("ES", 1, path)
+    assert stored["gas"].tolist() == [1, 30, 5]
+    assert np.isnan(stored["wind"].iloc[1])
+    assert stored["wind"].iloc[2] == 60
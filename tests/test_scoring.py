@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scoring import (
+    HEATING_TYPES,
+    energy_column,
+    estimate_energy_use,
+    estimate_energy_use_all,
+    score_energy_consumption_array,
+    score_energy_consumption_day,
+    score_frame,
+)
+
+
+def baseline_score(carbon_intensity, aqi, temp):
+    # The score formula as the app shipped it, on plain Python numbers
+    carbon_score = max(0, 10 - (carbon_intensity / 100))
+    aqi_score = max(2, 12 - aqi * 2)
+    temp_diff = abs(temp - 20)
+    temp_score = max(0, 10 - (temp_diff / 4))
+    final_score = (carbon_score * 0.5) + (aqi_score * 0.2) + (temp_score * 0.3)
+    return round(final_score, 1)
+
+
+# Inputs whose unrounded score sits on a .x5 boundary, where np.round and the
+# built-in round() disagree, with the scores the app has always shown
+TIES = [
+    ((337, 4, 13.8), 6.7),
+    ((537, 4, 9.8), 5.3),
+    ((306, 1, -5.6), 6.5),
+    ((123, 1, 37.8), 8.1),
+    ((239, 2, 0.6), 6.9),
+    ((95, 2, 41.0), 7.5),
+]
+
+
+@pytest.mark.parametrize("inputs, expected", TIES)
+def test_scores_on_ties_match_baseline(inputs, expected):
+    assert baseline_score(*inputs) == expected
+    assert score_energy_consumption_day(*inputs) == expected
+    assert float(score_energy_consumption_array(*inputs)) == expected
+
+
+def test_array_score_matches_baseline_on_realistic_inputs():
+    rng = np.random.default_rng(0)
+    rows = [
+        (int(rng.integers(0, 800)), int(rng.integers(1, 6)), round(float(rng.uniform(-10, 45)), 1))
+        for _ in range(20000)
+    ]
+    carbon, aqi, temp = (list(column) for column in zip(*rows))
+    scores = score_energy_consumption_array(carbon, aqi, temp).tolist()
+    assert scores == [baseline_score(*row) for row in rows]
+    assert [score_energy_consumption_day(*row) for row in rows] == scores
+
+
+def test_score_frame_matches_scalars():
+    df = pd.DataFrame({"carbon_intensity": [337.0, 537.0, 120.0], "aqi": [4.0, 4.0, 2.0], "temp": [13.8, 9.8, 30.0]})
+    scored = score_frame(df)
+    assert scored["score"].tolist() == [6.7, 5.3, baseline_score(120, 2, 30.0)]
+    for row in scored.itertuples():
+        for heating in HEATING_TYPES:
+            assert getattr(row, energy_column(heating)) == pytest.approx(estimate_energy_use(row.temp, heating))
+
+
+def test_energy_use_all_matches_scalar():
+    temps = np.array([-5.0, 12.3, 25.0, 31.0])
+    energy = estimate_energy_use_all(temps)
+    for i, temp in enumerate(temps):
+        assert energy[i].tolist() == pytest.approx([estimate_energy_use(temp, h) for h in HEATING_TYPES])